@@ -1,11 +1,171 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import openpyxl
+import re
+import threading
+import queue
+import csv
+import gzip
+import io
+import json
+import datetime
+import itertools
+import collections
+import contextlib
+import time
+import configparser
+import logging
+import logging.handlers
+import argparse
+import asyncio
+import concurrent.futures
+import urllib.request
+import urllib.parse
+import urllib.error
+import hmac
+import os
+import sys
+
+# Командная строка. Без команды открывается окно, с командой скрипт выполняет её
+# без окна и завершается, для заданий по расписанию:
+#   python Нотариальныйреестр.py --db registry.db export registry.csv.gz
+arg_parser = argparse.ArgumentParser(description="Нотариальный реестр")
+arg_parser.add_argument("--db", default="registry.db", help="файл базы данных (по умолчанию: registry.db)")
+arg_parser.add_argument("--server", help="работать через сервер реестра (http://хост:порт) вместо файла базы данных")
+# Печатает строку, когда окно нарисовано, и ещё одну, когда показана первая
+# страница, затем выходит (benchmarks/startup_benchmark.py)
+arg_parser.add_argument("--startup-time", action="store_true", help=argparse.SUPPRESS)
+commands = arg_parser.add_subparsers(dest="command", metavar="command")
+search_command = commands.add_parser("search", help="вывести найденные записи через табуляцию")
+search_command.add_argument("query", nargs="?", default="", help="текст, вводимый в поле поиска")
+search_command.add_argument("--from", dest="date_from", default="", help="первая дата, дд.мм.гггг")
+search_command.add_argument("--to", dest="date_to", default="", help="последняя дата, дд.мм.гггг")
+search_command.add_argument("--act-type", default="", help="тип документа")
+search_command.add_argument("--limit", type=int, help="вывести не больше этого числа записей")
+export_command = commands.add_parser("export", help="экспортировать все записи в файл .xlsx, .csv или .jsonl, "
+                                                            "с .gz для сжатия")
+export_command.add_argument("file")
+export_command.add_argument("--changes", action="store_true",
+                            help="только записи, сохранённые, изменённые или удалённые после последнего экспорта изменений")
+import_command = commands.add_parser("import", help="добавить записи из файла .xlsx или .csv")
+import_command.add_argument("file")
+commands.add_parser("stats", help="вывести число записей и суммы сборов по месяцам")
+commands.add_parser("vacuum", help="оптимизировать поисковый индекс и сжать базу данных")
+serve_command = commands.add_parser("serve", help="предоставить базу данных другим рабочим местам по HTTP")
+serve_command.add_argument("--host", default="127.0.0.1", help="адрес для приёма подключений (по умолчанию: 127.0.0.1)")
+serve_command.add_argument("--port", type=int, default=8765, help="порт для приёма подключений (по умолчанию: 8765)")
+serve_command.add_argument("--readers", type=int, default=4, help="соединения для чтения (по умолчанию: 4)")
+arguments = arg_parser.parse_args()
+
+# Настройки, читаются из registry.ini рядом с базой данных, если он есть
+settings = configparser.ConfigParser()
+settings.read(os.path.join(os.path.dirname(arguments.db), "registry.ini"), encoding="utf-8")
+# Общий режим нужен, когда одну базу используют несколько рабочих мест
+SHARED_MODE = settings.getboolean("database", "shared_mode", fallback=False)
+BUSY_TIMEOUT = settings.getint("database", "busy_timeout", fallback=5000)
+WRITE_RETRIES = settings.getint("database", "write_retries", fallback=3)
+# Групповая фиксация: сохранения формы фиксируются вместе, когда их ждёт GROUP_COMMIT
+# или через GROUP_COMMIT_MS мс без нового. 0 фиксирует каждое сохранение
+GROUP_COMMIT = settings.getint("database", "group_commit", fallback=0)
+GROUP_COMMIT_MS = settings.getint("database", "group_commit_ms", fallback=2000)
+STARTUP_TIMING = arguments.startup_time
+# Сохранения, поиски, страницы, удаления и экспорты дольше этого числа мс записываются в журнал
+SLOW_MS = settings.getint("diagnostics", "slow_ms", fallback=500)
+# Токен, который требует сервер и отправляют клиенты, пустой — без токена
+SERVER_TOKEN = settings.get("server", "token", fallback="")
+# Режим клиента: записи читает и пишет сервер, локальная база данных пустая и только для вида
+SERVER_URL = arguments.server.rstrip("/") if arguments.server else None
 
 # База данных
-conn = sqlite3.connect("registry.db")
+DB_PATH = ":memory:" if SERVER_URL else arguments.db
+
+
+def connect(check_same_thread=True):
+    # У каждого потока своё соединение, все ждут блокировку до BUSY_TIMEOUT мс
+    connection = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT / 1000, check_same_thread=check_same_thread)
+    # NORMAL может потерять последние коммиты при отключении питания, при групповом коммите в них много сохранений
+    if SHARED_MODE and not GROUP_COMMIT:
+        connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+def write_transaction(connection, work, *args):
+    # Короткая транзакция записи: блокировка берётся сразу, держится только на время
+    # этой работы и запрашивается повторно, если другое рабочее место держит её дольше
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                return work(connection, *args)
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES or "locked" not in str(e):
+                raise
+            time.sleep(0.2 * (attempt + 1))
+
+
+# Медленные операции пишутся в registry-slow.log рядом с базой данных, не больше 4 файлов по 1 МБ
+SLOW_LOG_PATH = os.path.join(os.path.dirname(arguments.db), "registry-slow.log")
+slow_log = logging.getLogger("registry.slow")
+slow_log.propagate = False
+# Логгер переживает скрипт, когда тот загружается снова в том же процессе
+if not slow_log.handlers:
+    slow_log_handler = logging.handlers.RotatingFileHandler(SLOW_LOG_PATH, maxBytes=1000000, backupCount=3,
+                                                            encoding="utf-8", delay=True)
+    slow_log_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_log.addHandler(slow_log_handler)
+
+# Время последних операций, сначала новые, для окна диагностики.
+# Каждый поток отмечает операцию, для которой работает, функция трассировки
+# соединений считает выполненные для неё запросы
+RECENT_OPERATIONS = 200
+SLOW_LOG_STATEMENTS = 5
+recent_operations = collections.deque(maxlen=RECENT_OPERATIONS)
+traced = threading.local()
+
+
+def start_operation(name):
+    return {"name": name, "at": datetime.datetime.now(), "started": time.perf_counter(),
+            "sql": 0.0, "tree": 0.0, "rows": 0, "statements": 0, "statement_text": [], "error": ""}
+
+
+@contextlib.contextmanager
+def timed(operation, part):
+    # Прибавляет время, проведённое внутри, к operation[part], "sql" или "tree"
+    traced.operation = operation
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        operation[part] += time.perf_counter() - started
+        traced.operation = None
+
+
+def trace_statement(statement):
+    # Каждый запрос на отслеживаемом соединении, включая запросы триггеров
+    operation = getattr(traced, "operation", None)
+    if operation:
+        operation["statements"] += 1
+        if len(operation["statement_text"]) < SLOW_LOG_STATEMENTS:
+            operation["statement_text"].append(" ".join(statement.split())[:500])
+
+
+def finish_operation(operation):
+    # Можно вызывать из любого потока, окно диагностики само читает recent_operations
+    operation["wall"] = time.perf_counter() - operation["started"]
+    recent_operations.appendleft(operation)
+    if operation["wall"] * 1000 >= SLOW_MS:
+        slow_log.warning(f"{operation['name']} {operation['wall'] * 1000:.0f} мс: "
+                         f"sql {operation['sql'] * 1000:.0f} мс, таблица {operation['tree'] * 1000:.0f} мс, "
+                         f"строк: {operation['rows']}, запросов: {operation['statements']} {operation['error']}"
+                         + "".join(f"\n    {text}" for text in operation["statement_text"]))
+
+
+conn = connect()
+conn.set_trace_callback(trace_statement)
 cursor = conn.cursor()
+if SHARED_MODE or arguments.command == "serve":
+    # WAL: поиск и экспорт читают снимок данных и не ждут сохранений
+    cursor.execute("PRAGMA journal_mode = WAL")
 cursor.execute('''
     CREATE TABLE IF NOT EXISTS registry (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,51 +182,992 @@ cursor.execute('''
 ''')
 conn.commit()
 
+# Столбцы, которые показываются в таблице и пишутся при экспорте, в этом порядке
+RECORD_COLUMNS = ("id, act_number, date, full_name, birth_date, personal_id, "
+                  "act_type, state_fee, assistance_payment, notes")
+columns = (
+    "ID", "Номер документа", "Дата", "ФИО", "Дата рождения", "Персональный ID",
+    "Тип документа", "Государственная пошлина", "Оплата помощи", "Примечания"
+)
+
+# Построчные триггеры AFTER INSERT, у каждого есть запрос, делающий то же самое для
+# всех строк после заданного id. Массовый импорт использует запрос вместо триггера
+insert_triggers = []
+# То же для триггеров AFTER DELETE, их инструкция выполняется над строками из
+# deleted_ids непосредственно перед удалением. Используется начиная с BULK_DELETE записей
+delete_triggers = []
+BULK_DELETE = 100
+
+# Полнотекстовый индекс для поиска, синхронизируется с таблицей триггерами
+FTS_INSERT_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS registry_fts_insert AFTER INSERT ON registry BEGIN
+        INSERT INTO registry_fts (rowid, full_name, birth_date, personal_id, act_number, notes)
+        VALUES (new.id, new.full_name, new.birth_date, new.personal_id, new.act_number, new.notes);
+    END
+'''
+FTS_DELETE_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS registry_fts_delete AFTER DELETE ON registry BEGIN
+        INSERT INTO registry_fts (registry_fts, rowid, full_name, birth_date, personal_id, act_number, notes)
+        VALUES ('delete', old.id, old.full_name, old.birth_date, old.personal_id, old.act_number, old.notes);
+    END
+'''
+cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'registry_fts'")
+fts_is_new = cursor.fetchone() is None
+try:
+    cursor.executescript(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS registry_fts USING fts5(
+            full_name, birth_date, personal_id, act_number, notes,
+            content='registry', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        {FTS_INSERT_TRIGGER};
+        {FTS_DELETE_TRIGGER};
+        CREATE TRIGGER IF NOT EXISTS registry_fts_update
+        AFTER UPDATE OF full_name, birth_date, personal_id, act_number, notes ON registry BEGIN
+            INSERT INTO registry_fts (registry_fts, rowid, full_name, birth_date, personal_id, act_number, notes)
+            VALUES ('delete', old.id, old.full_name, old.birth_date, old.personal_id, old.act_number, old.notes);
+            INSERT INTO registry_fts (rowid, full_name, birth_date, personal_id, act_number, notes)
+            VALUES (new.id, new.full_name, new.birth_date, new.personal_id, new.act_number, new.notes);
+        END;
+    ''')
+    if fts_is_new:
+        # Существующие базы: индексируются записи, сохранённые до появления индекса
+        cursor.execute("INSERT INTO registry_fts (registry_fts) VALUES ('rebuild')")
+    conn.commit()
+    insert_triggers.append(("registry_fts_insert", FTS_INSERT_TRIGGER, '''
+        INSERT INTO registry_fts (rowid, full_name, birth_date, personal_id, act_number, notes)
+        SELECT id, full_name, birth_date, personal_id, act_number, notes
+        FROM registry WHERE id > ?
+    '''))
+    delete_triggers.append(("registry_fts_delete", FTS_DELETE_TRIGGER, '''
+        INSERT INTO registry_fts (registry_fts, rowid, full_name, birth_date, personal_id, act_number, notes)
+        SELECT 'delete', id, full_name, birth_date, personal_id, act_number, notes
+        FROM registry WHERE id IN deleted_ids
+    '''))
+    fts_enabled = True
+except sqlite3.OperationalError:
+    # SQLite без FTS5, поиск выполняется через LIKE
+    fts_enabled = False
+
+
+
+def iso_date_sql(column):
+    # д.м.гггг или дд.мм.гггг (также с / или -) и гггг-м-д или гггг-мм-дд становятся гггг-мм-дд,
+    # всё остальное NULL, как и день, которого нет в месяце. Те же даты, что принимает iso_date()
+    def two_digits(start, length):
+        # День или месяц, с 0 впереди, если в нём одна цифра
+        return f"substr('0' || substr(text, {start}, {length}), -2)"
+
+    # Сначала дд.мм.гггг, так набирается большинство дат
+    cases = []
+    for day, month in itertools.product((2, 1), repeat=2):
+        for separator in "./-":
+            pattern = separator.join(("[0-9]" * day, "[0-9]" * month, "[0-9]" * 4))
+            cases.append(f"WHEN text GLOB '{pattern}' THEN substr(text, {day + month + 3}, 4)"
+                         f" || '-' || {two_digits(day + 2, month)} || '-' || {two_digits(1, day)}")
+        pattern = "-".join(("[0-9]" * 4, "[0-9]" * month, "[0-9]" * day))
+        cases.append(f"WHEN text GLOB '{pattern}' THEN substr(text, 1, 4)"
+                     f" || '-' || {two_digits(6, month)} || '-' || {two_digits(7 + month, day)}")
+    # date() переносит 31.02 на март, настоящая дата возвращается без изменений
+    return f'''(SELECT iso FROM (SELECT CASE {" ".join(cases)} END AS iso FROM (SELECT trim({column}) AS text))
+             WHERE date(iso, '+0 days') = iso)'''
+
+
+def minor_units_sql(column):
+    # "150", "150.5" или "1 500,50" становятся целой суммой в бани, остальное NULL
+    amount = f"replace(replace({column}, ' ', ''), ',', '.')"
+    return f'''CASE
+        WHEN {amount} GLOB '*[0-9]*' AND {amount} NOT GLOB '*[^0-9.]*' AND {amount} NOT GLOB '*.*.*'
+            THEN CAST(round(CAST({amount} AS REAL) * 100) AS INTEGER)
+    END'''
+
+
+def typed_values_sql(row):
+    # row равно "new." внутри триггера и "" в запросе по всей таблице
+    return f'''
+        date_iso = {iso_date_sql(row + "date")},
+        birth_date_iso = {iso_date_sql(row + "birth_date")},
+        state_fee_minor = {minor_units_sql(row + "state_fee")},
+        assistance_payment_minor = {minor_units_sql(row + "assistance_payment")}
+    '''
+
+
+TYPED_INSERT_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_typed_insert AFTER INSERT ON registry BEGIN
+        UPDATE registry SET {typed_values_sql("new.")} WHERE id = new.id;
+    END
+'''
+
+TYPED_UPDATE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_typed_update
+    AFTER UPDATE OF date, birth_date, state_fee, assistance_payment ON registry BEGIN
+        UPDATE registry SET {typed_values_sql("new.")} WHERE id = new.id;
+    END
+'''
+
+
+def summary_change_sql(row, sign):
+    # Добавляет (sign 1) или вычитает (sign -1) одну запись в её месяце и типе документа
+    return f'''
+        INSERT INTO registry_summary (month, act_type, act_count, state_fee_minor, assistance_payment_minor)
+        VALUES (ifnull(substr({iso_date_sql(row + "date")}, 1, 7), ''), ifnull({row}act_type, ''), {sign},
+                {sign} * ifnull({minor_units_sql(row + "state_fee")}, 0),
+                {sign} * ifnull({minor_units_sql(row + "assistance_payment")}, 0))
+        ON CONFLICT (month, act_type) DO UPDATE SET
+            act_count = act_count + excluded.act_count,
+            state_fee_minor = state_fee_minor + excluded.state_fee_minor,
+            assistance_payment_minor = assistance_payment_minor + excluded.assistance_payment_minor;
+    '''
+
+
+def summary_totals_sql(condition, sign=1):
+    # Добавляет (или со знаком -1 вычитает) записи, подходящие под condition, сгруппированные, по типизированным столбцам
+    return f'''
+        INSERT INTO registry_summary (month, act_type, act_count, state_fee_minor, assistance_payment_minor)
+        SELECT ifnull(substr(date_iso, 1, 7), ''), ifnull(act_type, ''), {sign} * count(*),
+               {sign} * ifnull(sum(state_fee_minor), 0), {sign} * ifnull(sum(assistance_payment_minor), 0)
+        FROM registry WHERE {condition}
+        GROUP BY 1, 2
+        ON CONFLICT (month, act_type) DO UPDATE SET
+            act_count = act_count + excluded.act_count,
+            state_fee_minor = state_fee_minor + excluded.state_fee_minor,
+            assistance_payment_minor = assistance_payment_minor + excluded.assistance_payment_minor
+    '''
+
+
+SUMMARY_INSERT_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_summary_insert AFTER INSERT ON registry BEGIN
+        {summary_change_sql("new.", 1)}
+    END
+'''
+
+SUMMARY_DELETE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_summary_delete AFTER DELETE ON registry BEGIN
+        {summary_change_sql("old.", -1)}
+        DELETE FROM registry_summary WHERE act_count = 0;
+    END
+'''
+
+SUMMARY_UPDATE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_summary_update
+    AFTER UPDATE OF date, act_type, state_fee, assistance_payment ON registry BEGIN
+        {summary_change_sql("old.", -1)}
+        {summary_change_sql("new.", 1)}
+        DELETE FROM registry_summary WHERE act_count = 0;
+    END
+'''
+
+
+def record_change_sql(row, deleted):
+    # Запись получает следующий номер изменения, удалённая остаётся как отметка об удалении
+    return f'''
+        INSERT INTO registry_changes (record_id, change_seq, deleted)
+        VALUES ({row}id, (SELECT ifnull(max(change_seq), 0) + 1 FROM registry_changes), {deleted})
+        ON CONFLICT (record_id) DO UPDATE SET change_seq = excluded.change_seq, deleted = excluded.deleted;
+    '''
+
+
+CHANGES_INSERT_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_changes_insert AFTER INSERT ON registry BEGIN
+        {record_change_sql("new.", 0)}
+    END
+'''
+
+CHANGES_DELETE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS registry_changes_delete AFTER DELETE ON registry BEGIN
+        {record_change_sql("old.", 1)}
+    END
+'''
+
+# Миграции схемы, PRAGMA user_version — номер последней применённой.
+# Каждая миграция — список запросов, выполняемых в одной транзакции
+MIGRATIONS = [
+    # 1: даты ISO и сборы в бани рядом с введённым текстом, для диапазонов и итогов.
+    # Фильтры по диапазону дат и типу документа используют один индекс, дата — его первый столбец
+    [
+        "ALTER TABLE registry ADD COLUMN date_iso TEXT",
+        "ALTER TABLE registry ADD COLUMN birth_date_iso TEXT",
+        "ALTER TABLE registry ADD COLUMN state_fee_minor INTEGER",
+        "ALTER TABLE registry ADD COLUMN assistance_payment_minor INTEGER",
+        f"UPDATE registry SET {typed_values_sql('')}",
+        TYPED_INSERT_TRIGGER,
+        TYPED_UPDATE_TRIGGER,
+        "CREATE INDEX registry_date_act_type ON registry (date_iso, act_type)",
+        "CREATE INDEX registry_birth_date_iso ON registry (birth_date_iso)",
+        "CREATE INDEX registry_state_fee_minor ON registry (state_fee_minor)",
+        "CREATE INDEX registry_assistance_payment_minor ON registry (assistance_payment_minor)",
+    ],
+    # 2: поиск по IDNP, номеру акта и имени
+    [
+        "CREATE INDEX registry_personal_id ON registry (personal_id)",
+        "CREATE INDEX registry_act_number ON registry (act_number)",
+        "CREATE INDEX registry_full_name ON registry (full_name COLLATE NOCASE)",
+    ],
+    # 3: число документов и суммы сборов по месяцам и типам документов, обновляются триггерами
+    [
+        '''
+            CREATE TABLE registry_summary (
+                month TEXT,
+                act_type TEXT,
+                act_count INTEGER,
+                state_fee_minor INTEGER,
+                assistance_payment_minor INTEGER,
+                PRIMARY KEY (month, act_type)
+            ) WITHOUT ROWID
+        ''',
+        summary_totals_sql("true"),
+        SUMMARY_INSERT_TRIGGER,
+        SUMMARY_DELETE_TRIGGER,
+        SUMMARY_UPDATE_TRIGGER,
+    ],
+    # 4: номера изменений и отметки об удалении, чтобы экспортировать только изменённое с прошлого раза.
+    # Записи, сохранённые раньше, — это изменения, ещё не экспортированные
+    [
+        '''
+            CREATE TABLE registry_changes (
+                record_id INTEGER PRIMARY KEY,
+                change_seq INTEGER NOT NULL,
+                deleted INTEGER NOT NULL
+            )
+        ''',
+        "CREATE UNIQUE INDEX registry_changes_seq ON registry_changes (change_seq)",
+        "INSERT INTO registry_changes (record_id, change_seq, deleted) SELECT id, id, 0 FROM registry",
+        CHANGES_INSERT_TRIGGER,
+        f'''
+            CREATE TRIGGER registry_changes_update
+            AFTER UPDATE OF act_number, date, full_name, birth_date, personal_id,
+                            act_type, state_fee, assistance_payment, notes ON registry BEGIN
+                {record_change_sql("new.", 0)}
+            END
+        ''',
+        CHANGES_DELETE_TRIGGER,
+        # Последнее изменение, записанное экспортом изменений
+        "CREATE TABLE registry_export_mark (change_seq INTEGER)",
+        "INSERT INTO registry_export_mark (change_seq) VALUES (0)",
+    ],
+]
+
+
+def migrate(connection):
+    # Проверяется ещё раз внутри транзакции, другое рабочее место могло уже выполнить миграцию
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+        for statement in statements:
+            connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {number}")
+
+
+if cursor.execute("PRAGMA user_version").fetchone()[0] < len(MIGRATIONS):
+    write_transaction(conn, migrate)
+insert_triggers.append(("registry_typed_insert", TYPED_INSERT_TRIGGER,
+                        f"UPDATE registry SET {typed_values_sql('')} WHERE id > ?"))
+# После типизированных столбцов итоги суммируются по ним
+insert_triggers.append(("registry_summary_insert", SUMMARY_INSERT_TRIGGER, summary_totals_sql("id > ?")))
+insert_triggers.append(("registry_changes_insert", CHANGES_INSERT_TRIGGER, '''
+    INSERT INTO registry_changes (record_id, change_seq, deleted)
+    SELECT id, newest.change_seq + row_number() OVER (ORDER BY id), 0
+    FROM registry, (SELECT ifnull(max(change_seq), 0) AS change_seq FROM registry_changes) AS newest
+    WHERE id > ?
+'''))
+delete_triggers.append(("registry_summary_delete", SUMMARY_DELETE_TRIGGER, summary_totals_sql("id IN deleted_ids", -1)))
+delete_triggers.append(("registry_changes_delete", CHANGES_DELETE_TRIGGER, '''
+    INSERT INTO registry_changes (record_id, change_seq, deleted)
+    SELECT id, newest.change_seq + row_number() OVER (ORDER BY id), 1
+    FROM registry, (SELECT ifnull(max(change_seq), 0) AS change_seq FROM registry_changes) AS newest
+    WHERE id IN deleted_ids
+    ON CONFLICT (record_id) DO UPDATE SET change_seq = excluded.change_seq, deleted = excluded.deleted
+'''))
+
+# Строки показываются постранично, следующая страница читается при прокрутке
+PAGE_SIZE = 200
+# Строка поиска и фильтры показанных строк: (query, date_from, date_to, act_type), даты ISO
+NO_SEARCH = ("", None, None, "")
+view_search = NO_SEARCH
+view_last_id = 0
+view_complete = False
+page_pending = False
+# Время читаемой страницы, см. start_operation()
+view_operation = None
+# Строки в таблице и записи, подходящие под вид, для счётчика «Загружено N из M»
+view_loaded = 0
+view_total = None
+
+# Строки таблицы читает отдельный поток со своим соединением и возвращает
+# их небольшими частями. Каждый новый вид получает новый номер поколения,
+# поэтому строки старого запроса отбрасываются, а его SQL прерывается.
+CHUNK_SIZE = 50
+# Порции добавляются в таблицу не дольше TREE_BUDGET мс за раз, затем у Tk есть
+# TREE_PAUSE мс, чтобы перерисовать окно и обработать ввод перед следующими
+TREE_BUDGET = 30
+TREE_PAUSE = 10
+read_conn = connect(check_same_thread=False)
+read_conn.set_trace_callback(trace_statement)
+read_requests = queue.Queue()
+read_results = queue.Queue()
+view_generation = 0
+
+# Страницы и количества недавних поисков по поиску и странице, сверх SEARCH_CACHE_ROWS
+# строк первыми уходят давно не использованные. PRAGMA data_version соединения чтения
+# меняется при каждой фиксации другого соединения, здесь или на другом компьютере,
+# и тогда кэш очищается. В режиме клиента не используется
+SEARCH_CACHE_ROWS = 10000
+search_cache = collections.OrderedDict()
+search_cache_rows = 0
+search_cache_version = None
+search_cache_hits = 0
+search_cache_misses = 0
+
+# Сохранения, правки, удаления и отчёты окна — задания для потока базы данных,
+# у которого своё соединение и который выполняет их по одному. Заблокированная
+# база данных или медленный сервер никогда не замораживают окно, см. run_db_job()
+db_jobs = queue.Queue()
+db_results = queue.Queue()
+# Сохранение формы, которое сейчас записывается, форма ждёт его
+form_operation = None
+# Сохранения в открытой транзакции группы, используется только в потоке базы данных
+group_saves = 0
+
+# Поиск запускается при вводе, после паузы в SEARCH_DELAY мс
+SEARCH_DELAY = 250
+search_timer = None
+
+# Полный IDNP ищется точно, всё, что похоже на номер акта ("125", "125/2024"),
+# по префиксу в индексах. Даты и имена идут в полнотекстовый поиск,
+# цифры с / или - ("1985", "15/03/1980") могут быть номером документа или датой рождения
+IDNP_PATTERN = re.compile(r"\d{13}")
+ACT_NUMBER_PATTERN = re.compile(r"\d[\w/-]*")
+DATE_PATTERN = re.compile(r"\d[\d/-]*")
+
+# Количество строк, читаемых из базы за раз при экспорте
+EXPORT_BATCH = 5000
+
+# Экспорт изменений: записи, изменённые после номера изменения, по порядку. Удалённая
+# запись — строка только с её ID и столбцом «Удалено», равным 1
+CHANGES_QUERY = f'''
+    SELECT change_seq, record_id, {RECORD_COLUMNS.replace("id, ", "", 1)}, deleted
+    FROM registry_changes LEFT JOIN registry ON registry.id = registry_changes.record_id
+    WHERE change_seq > ? AND change_seq <= ? ORDER BY change_seq LIMIT ?
+'''
+# Предлагаются обеими кнопками экспорта
+EXPORT_FILETYPES = [("Excel файлы", "*.xlsx"), ("CSV файлы", "*.csv"), ("JSON Lines files", "*.jsonl"),
+                    ("Compressed CSV files", "*.csv.gz"), ("Compressed JSON Lines files", "*.jsonl.gz")]
+
+# Количество строк в одной транзакции при импорте
+IMPORT_BATCH = 50000
+
+# Экспорт и импорт выполняются по одному в фоновом потоке со своим
+# соединением и сообщают о ходе через очередь
+task_thread = None
+task_cancel = threading.Event()
+task_messages = queue.Queue()
+
+reports_window = None
+diagnostics_window = None
+
+# Режим сервера ("serve"): один процесс владеет базой данных для клиентских рабочих мест.
+# Чтения используют общий пул соединений, записи ждут в одной очереди единственного
+# писателя, который сохраняет всё ожидающее (до WRITE_GROUP заданий) одной транзакцией
+WRITE_QUEUE = 1000
+WRITE_GROUP = 100
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+                500: "Internal Server Error"}
+server_readers = None
+server_read_executor = None
+server_writes = None
+server_write_executor = None
+server_write_conn = None
+
+# Запись, загруженная в форму кнопкой «Изменить», сохраняется поверх себя, а не как новая
+editing_id = None
+
 # Функции
 def save_record():
+    global form_operation
+    if form_operation:
+        return
     values = tuple(entry.get().strip() for entry in entries)
-    try:
-        cursor.execute('''
-            INSERT INTO registry (act_number, date, full_name, birth_date, personal_id,
-                                  act_type, state_fee, assistance_payment, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', values)
-        conn.commit()
+    if editing_id is not None:
+        operation = form_operation = start_operation("изменение")
+        record_id = editing_id
+        run_db_job(operation, store_edit, (record_id, values),
+                   lambda updated: edit_saved(operation, record_id, values, updated))
+    else:
+        operation = form_operation = start_operation("сохранение")
+        run_db_job(operation, store_record, (values,),
+                   lambda record_id: record_saved(operation, values, record_id))
+    save_button.config(state="disabled")
+
+
+def store_record(connection, values):
+    global group_saves
+    if SERVER_URL:
+        return server_request("POST", "/records", {"records": [values]})["ids"][0]
+    if not GROUP_COMMIT:
+        return write_transaction(connection, insert_record, values)
+    # Транзакция остаётся открытой для следующих сохранений, см. commit_group()
+    if not connection.in_transaction:
+        connection.execute("BEGIN IMMEDIATE")
+    record_id = insert_record(connection, values)
+    group_saves += 1
+    if group_saves >= GROUP_COMMIT:
+        commit_group(connection)
+    return record_id
+
+
+def commit_group(connection):
+    # Возвращает число зафиксированных сохранений. Если фиксация не удалась, они
+    # остаются в транзакции и следующая фиксация пробует снова
+    global group_saves
+    if connection.in_transaction:
+        connection.commit()
+    saves, group_saves = group_saves, 0
+    return saves
+
+
+def queue_group_commit():
+    operation = start_operation("фиксация группы")
+    run_db_job(operation, commit_group, (), lambda saves: operation.update(rows=saves))
+
+
+def record_saved(operation, values, record_id):
+    global view_last_id, view_loaded, view_total
+    operation["rows"] = 1
+    status_label.config(text="✅ Сохранено!")
+
+    # Добавляется только новая строка и только если список загружен до конца
+    if not any(view_search) and view_complete and not page_pending and not table.exists(record_id):
+        with timed(operation, "tree"):
+            table.insert('', 'end', iid=record_id, values=(record_id, *values))
+            table.see(record_id)
+        view_last_id = record_id
+        view_loaded += 1
+    if not any(view_search) and view_total is not None:
+        view_total += 1
+    show_loaded()
+
+    clear_form()
+
+
+def insert_record(connection, values):
+    return connection.execute('''
+        INSERT INTO registry (act_number, date, full_name, birth_date, personal_id,
+                              act_type, state_fee, assistance_payment, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', values).lastrowid
+
+
+def edit_record():
+    if form_operation:
+        return
+    selected = table.selection()
+    if not selected:
+        messagebox.showwarning("Внимание", "Пожалуйста, выберите запись для изменения.")
+        return
+    record_id = table.item(selected[0])['values'][0]
+    # Читается заново по id, значения в таблице теряют ведущие нули чисел
+    run_db_job(start_operation("открытие для правки"), read_page, (NO_SEARCH, record_id - 1, 1),
+               lambda rows: fill_form(record_id, rows))
+
+
+def fill_form(record_id, rows):
+    global editing_id
+    if form_operation:
+        return
+    if not rows or rows[0][0] != record_id:
+        status_label.config(text="❌ Запись тем временем была удалена")
+        return
+    clear_form()
+    for entry, value in zip(entries, rows[0][1:]):
+        if isinstance(entry, ttk.Combobox):
+            entry.set(value or "")
+        else:
+            entry.insert(0, value or "")
+    editing_id = record_id
+    save_button.config(text="💾 Сохранить изменения")
+    status_label.config(text=f"✏️ Изменение записи {record_id}, Esc для отмены")
+
+
+def store_edit(connection, record_id, values):
+    if SERVER_URL:
+        return server_request("PUT", f"/records/{record_id}", {"record": values})["updated"]
+    return write_transaction(connection, update_row, record_id, values)
+
+
+def edit_saved(operation, record_id, values, updated):
+    global view_loaded, view_total
+    operation["rows"] = updated
+    if updated:
+        # Перерисовывается только изменённая строка, id и остальная таблица остаются как были
+        if table.exists(record_id):
+            with timed(operation, "tree"):
+                table.item(record_id, values=(record_id, *values))
         status_label.config(text="✅ Сохранено!")
-        display_records()
+    else:
+        # Удалена с другого рабочего места, её строка тоже убирается
+        if table.exists(record_id):
+            table.delete(record_id)
+            view_loaded -= 1
+        if view_total is not None:
+            view_total -= 1
+        show_loaded()
+        status_label.config(text="❌ Запись тем временем была удалена")
+    clear_form()
 
-        # Очистка полей после сохранения
-        for entry in entries:
-            if isinstance(entry, tk.Entry):
-                entry.delete(0, tk.END)
-            elif isinstance(entry, ttk.Combobox):
-                entry.set("")
 
-    except Exception as e:
-        status_label.config(text=f"❌ Ошибка: {e}")
+def update_row(connection, record_id, values):
+    # Триггеры обновляют типизированные столбцы, поисковый индекс, итоги и изменения
+    return connection.execute('''
+        UPDATE registry SET act_number = ?, date = ?, full_name = ?, birth_date = ?, personal_id = ?,
+                            act_type = ?, state_fee = ?, assistance_payment = ?, notes = ?
+        WHERE id = ?
+    ''', (*values, record_id)).rowcount
+
+
+def cancel_edit():
+    if editing_id is not None and not form_operation:
+        clear_form()
+        status_label.config(text="")
+
+
+def clear_form():
+    global editing_id
+    editing_id = None
+    save_button.config(text="💾 Сохранить")
+    for entry in entries:
+        if isinstance(entry, tk.Entry):
+            entry.delete(0, tk.END)
+        elif isinstance(entry, ttk.Combobox):
+            entry.set("")
 
 
 def search_records():
-    query = search_entry.get().strip()
-    for row in table.get_children():
-        table.delete(row)
-    cursor.execute("""
-        SELECT * FROM registry WHERE 
-            full_name LIKE ? OR 
-            birth_date LIKE ? OR 
-            personal_id LIKE ? OR 
-            act_number LIKE ?
-    """, (f"%{query}%",)*4)
-    for row in cursor.fetchall():
-        table.insert('', 'end', values=row)
+    global search_timer, page_pending, view_operation
+    if search_timer:
+        app.after_cancel(search_timer)
+        search_timer = None
+    date_from = filter_date(date_from_entry)
+    date_to = filter_date(date_to_entry)
+    if date_from is False or date_to is False:
+        # Ввод остановил чтение показанного списка, загруженное остаётся,
+        # а следующая страница снова читается при прокрутке
+        cancel_reads()
+        if view_operation:
+            view_operation["error"] = "отменён"
+            finish_operation(view_operation)
+            view_operation = None
+        page_pending = False
+        return
+    show_records((search_entry.get().strip(), date_from, date_to, act_type_filter.get().strip()), "поиск")
+
+
+def search_condition(query, date_from=None, date_to=None, act_type=""):
+    # Условие WHERE и параметры поиска, даты в ISO
+    conditions = []
+    params = {}
+    # Диапазон дат и тип документа, ищутся вместе по registry_date_act_type
+    filters = []
+    if date_from:
+        filters.append("date_iso >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        filters.append("date_iso <= :date_to")
+        params["date_to"] = date_to
+    if act_type:
+        filters.append("act_type = :act_type")
+        params["act_type"] = act_type
+    if filters:
+        conditions.append(f"id IN (SELECT id FROM registry WHERE {' AND '.join(filters)})")
+
+    if not query:
+        pass
+    elif IDNP_PATTERN.fullmatch(query):
+        conditions.append("id IN (SELECT id FROM registry WHERE personal_id = :query)")
+        params["query"] = query
+    elif ACT_NUMBER_PATTERN.fullmatch(query):
+        # Без фильтров каждая часть читается по странице, как в полнотекстовом поиске ниже.
+        # Префиксы читаются по своим индексам и сортируются (+id), проход таблицы в порядке id
+        # прошёл бы почти всю таблицу для редкого префикса
+        page = "" if conditions else "AND id > :last_id ORDER BY +id LIMIT :limit"
+        rowid_page = "" if conditions else "AND rowid > :last_id ORDER BY rowid LIMIT :limit"
+        parts = [f"SELECT id FROM registry WHERE act_number >= :query AND act_number < :query_end {page}"]
+        # Одни цифры могут быть и началом IDNP
+        if query.isdigit():
+            parts.append(f"SELECT id FROM registry WHERE personal_id >= :query AND personal_id < :query_end {page}")
+        # или год, день либо вся дата рождения. Только целые слова,
+        # префикс числа — начало большинства дат в индексе
+        if DATE_PATTERN.fullmatch(query):
+            if fts_enabled:
+                parts.append(f"SELECT rowid AS id FROM registry_fts WHERE registry_fts MATCH :match {rowid_page}")
+                params["match"] = f'"{query}"'
+            else:
+                parts.append(f"SELECT id FROM registry WHERE birth_date LIKE :birth_date {rowid_page}")
+                params["birth_date"] = f"%{query}%"
+        # Часть со своим LIMIT должна быть подзапросом внутри UNION ALL
+        condition = " UNION ALL ".join(f"SELECT id FROM ({part})" for part in parts)
+        conditions.append(f"id IN ({condition})")
+        params.update(query=query, query_end=prefix_end(query))
+    elif fts_enabled:
+        # Без фильтров индекс читается по одной странице, с ними страница
+        # совпадений может дать меньше строк, чем страница
+        page = "" if conditions else "AND rowid > :last_id ORDER BY rowid LIMIT :limit"
+        conditions.append(f"""
+            id IN (SELECT rowid FROM registry_fts
+                   WHERE registry_fts MATCH :match {page})
+        """)
+        params["match"] = fts_query(query)
+    else:
+        conditions.append("""(
+            full_name LIKE :query OR 
+            birth_date LIKE :query OR 
+            personal_id LIKE :query OR 
+            act_number LIKE :query
+        )""")
+        params["query"] = f"%{query}%"
+    return " AND ".join(conditions), params
+
+
+def filter_date(entry):
+    # Пустое поле — без ограничения. Ещё не дописанная дата
+    # окрашивает поле в красный и останавливает поиск
+    entry.config(bg="#444")
+    try:
+        return iso_date(entry.get())
+    except ValueError:
+        entry.config(bg="#8b1a1a")
+        return False
+
+
+def iso_date(text):
+    # Те же форматы, что в iso_date_sql(), None для пустого текста
+    text = text.strip()
+    if not text:
+        return None
+    for date_format in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"это не дата: {text}")
+
+
+def fts_query(text):
+    # Каждое слово ищется как префикс, должны совпасть все слова
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+
+def prefix_end(text):
+    # Первая строка после всех строк, начинающихся с text
+    return text[:-1] + chr(ord(text[-1]) + 1)
 
 
 def display_records():
-    for row in table.get_children():
-        table.delete(row)
-    cursor.execute("SELECT * FROM registry")
-    for row in cursor.fetchall():
-        table.insert('', 'end', values=row)
+    show_records()
+
+
+def refresh_records():
+    search_entry.delete(0, tk.END)
+    date_from_entry.delete(0, tk.END)
+    date_to_entry.delete(0, tk.END)
+    act_type_filter.set("")
+    search_records()
+
+
+def on_search_typed(*args):
+    global search_timer
+    # Запрос для прежнего текста сразу останавливается,
+    # новый запускается, когда ввод приостановлен
+    cancel_reads()
+    if search_timer:
+        app.after_cancel(search_timer)
+    search_timer = app.after(SEARCH_DELAY, search_records)
+
+
+def cancel_reads():
+    global view_generation
+    view_generation += 1
+    read_conn.interrupt()
+
+
+def show_records(search=NO_SEARCH, operation_name="показ"):
+    global view_search, view_last_id, view_complete, page_pending, view_operation, view_loaded, view_total
+    cancel_reads()
+    # Измеряется до показа первой страницы, включая очистку таблицы
+    view_operation = start_operation(operation_name)
+    with timed(view_operation, "tree"):
+        table.delete(*table.get_children())
+    view_search = search
+    view_last_id = 0
+    view_complete = False
+    page_pending = False
+    view_loaded = 0
+    view_total = None
+    show_loaded()
+    load_next_page()
+    # Считается после чтения первой страницы, чтобы никогда её не задерживать
+    read_requests.put((view_generation, search, None, None))
+
+
+def load_next_page():
+    # Постраничная выборка по ключу: читаются только строки после последней показанной
+    global page_pending, view_operation
+    if view_complete or page_pending:
+        return
+    page_pending = True
+    if not view_operation:
+        view_operation = start_operation("следующая страница")
+    read_requests.put((view_generation, view_search, view_last_id, view_operation))
+
+
+def page_query(condition):
+    # Следующие :limit строк после :last_id, подходящие под condition
+    condition = f"AND ({condition})" if condition else ""
+    return f"SELECT {RECORD_COLUMNS} FROM registry WHERE id > :last_id {condition} ORDER BY id LIMIT :limit"
+
+
+def read_page(connection, search, last_id, limit):
+    # Следующие limit строк поиска после last_id, в режиме клиента — с сервера
+    if SERVER_URL:
+        return server_request("GET", search_url("/records", search, last_id=last_id, limit=limit))["rows"]
+    condition, params = search_condition(*search)
+    return connection.execute(page_query(condition), {**params, "last_id": last_id, "limit": limit}).fetchall()
+
+
+def count_records(connection, search):
+    # Сколько записей находит поиск, все записи посчитаны в registry_summary
+    if SERVER_URL:
+        return server_request("GET", search_url("/count", search))["count"]
+    if not any(search):
+        return sum(row[2] for row in summary_rows(connection))
+    condition, params = search_condition(*search)
+    # Полнотекстовый поиск без фильтров читается страницами по rowid, здесь — до конца
+    return connection.execute(f"SELECT count(*) FROM registry WHERE {condition}",
+                              {**params, "last_id": 0, "limit": -1}).fetchone()[0]
+
+
+def search_url(path, search, **params):
+    # Режим клиента: запрос поиска, сервер разбирает его обратно через request_search()
+    query, date_from, date_to, act_type = search
+    return path + "?" + urllib.parse.urlencode({
+        "query": query, "date_from": date_from or "", "date_to": date_to or "", "act_type": act_type, **params})
+
+
+def server_request(method, path, data=None):
+    # Режим клиента: один запрос к серверу реестра, JSON в обе стороны
+    request = urllib.request.Request(SERVER_URL + path, method=method,
+                                     data=None if data is None else json.dumps(data).encode(),
+                                     headers={"Content-Type": "application/json",
+                                              "Authorization": f"Bearer {SERVER_TOKEN}"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        # Сервер сообщает в теле ответа, что пошло не так, прокси между ними может ответить страницей
+        try:
+            message = json.load(e)["error"]
+        except (ValueError, KeyError, TypeError):
+            message = f"{e.code} {e.reason}"
+        raise RuntimeError(message) from None
+    except urllib.error.URLError as e:
+        # По этому адресу нет сервера, или сеть недоступна
+        raise RuntimeError(f"{SERVER_URL} недоступен: {e.reason}") from None
+    except ValueError:
+        raise RuntimeError(f"{SERVER_URL} ответил не как сервер реестра") from None
+
+
+def read_worker():
+    # Работает в потоке чтения, виджеты не трогает
+    while True:
+        generation, search, last_id, operation = read_requests.get()
+        if generation != view_generation:
+            continue
+        if last_id is None:
+            try:
+                count = cached_search((search, None))
+                if count is None:
+                    count = count_records(read_conn, search)
+                    cache_search((search, None), count, 1)
+                read_results.put(("count", generation, count))
+            except (sqlite3.Error, OSError, RuntimeError):
+                # Прерван более новым видом или нет ответа: счётчик показывается без итога
+                pass
+            continue
+        read_cursor = read_conn.cursor()
+        try:
+            with timed(operation, "sql"):
+                if SERVER_URL:
+                    rows = read_page(None, search, last_id, PAGE_SIZE)
+                else:
+                    rows = cached_search((search, last_id))
+                if rows is not None:
+                    chunks = (rows[i:i + CHUNK_SIZE] for i in range(0, len(rows), CHUNK_SIZE))
+                else:
+                    condition, params = search_condition(*search)
+                    read_cursor.execute(page_query(condition), {**params, "last_id": last_id, "limit": PAGE_SIZE})
+                    chunks = iter(lambda: read_cursor.fetchmany(CHUNK_SIZE), [])
+                page = []
+                for chunk in chunks:
+                    if generation != view_generation:
+                        break
+                    page += chunk
+                    read_results.put(("rows", generation, chunk))
+                else:
+                    # Сохраняется только страница, прочитанная до конца
+                    if rows is None:
+                        cache_search((search, last_id), page, len(page))
+            read_results.put(("end", generation, len(page)))
+        except (sqlite3.Error, OSError, RuntimeError) as e:
+            # Прерванный запрос относится к виду, которого уже нет
+            read_results.put(("error", generation, e))
+        finally:
+            read_cursor.close()
+
+
+def cached_search(key):
+    # Выполняется в потоке чтения: строки или количество в кэше для key, None если их нет
+    global search_cache_rows, search_cache_version, search_cache_hits, search_cache_misses
+    if SERVER_URL:
+        return None
+    version = read_conn.execute("PRAGMA data_version").fetchone()[0]
+    if version != search_cache_version:
+        search_cache.clear()
+        search_cache_rows = 0
+        search_cache_version = version
+    if key not in search_cache:
+        search_cache_misses += 1
+        return None
+    search_cache_hits += 1
+    search_cache.move_to_end(key)
+    return search_cache[key][0]
+
+
+def cache_search(key, result, rows):
+    global search_cache_rows
+    if SERVER_URL:
+        return
+    search_cache[key] = (result, rows)
+    search_cache_rows += rows
+    while search_cache_rows > SEARCH_CACHE_ROWS:
+        search_cache_rows -= search_cache.popitem(last=False)[1][1]
+
+
+def poll_reads():
+    global view_last_id, view_complete, page_pending, view_operation, view_loaded, view_total
+    deadline = time.perf_counter() + TREE_BUDGET / 1000
+    while not read_results.empty():
+        kind, generation, data = read_results.get()
+        if generation != view_generation:
+            continue
+        if kind == "rows":
+            with timed(view_operation, "tree"):
+                for row in data:
+                    table.insert('', 'end', iid=row[0], values=row)
+            view_last_id = data[-1][0]
+            view_loaded += len(data)
+            show_loaded()
+        elif kind == "count":
+            view_total = data
+            show_loaded()
+        elif kind == "end":
+            page_pending = False
+            view_complete = data < PAGE_SIZE
+            view_operation["rows"] = data
+            finish_operation(view_operation)
+            view_operation = None
+            if STARTUP_TIMING:
+                print("first page", flush=True)
+                app.quit()
+        else:
+            page_pending = False
+            view_operation["error"] = str(data)
+            finish_operation(view_operation)
+            view_operation = None
+            status_label.config(text=f"❌ Ошибка: {data}")
+        if time.perf_counter() > deadline:
+            break
+    # Оставшиеся порции добавляются после перерисовки окна
+    app.after(TREE_PAUSE if not read_results.empty() else 20, poll_reads)
+
+
+def show_loaded():
+    if view_total is None:
+        loaded_label.config(text=f"Загружено {view_loaded}")
+    else:
+        loaded_label.config(text=f"Загружено {view_loaded} из {max(view_total, view_loaded)}")
+
+
+def run_db_job(operation, work, args, done):
+    # work(connection, *args) выполняется в потоке базы данных, затем done(result) в потоке Tk
+    db_jobs.put((operation, work, args, done))
+
+
+def db_worker():
+    # Выполняется в потоке базы данных, никогда не трогает виджеты
+    connection = connect()
+    connection.set_trace_callback(trace_statement)
+    while True:
+        try:
+            # Сохранения, ждущие в группе, фиксируются, если заданий нет GROUP_COMMIT_MS мс
+            operation, work, args, done = db_jobs.get(timeout=GROUP_COMMIT_MS / 1000 if group_saves else None)
+        except queue.Empty:
+            queue_group_commit()
+            continue
+        try:
+            with timed(operation, "sql"):
+                if group_saves and work not in (store_record, commit_group):
+                    # Правки, удаления и отчёты идут после сохранений перед ними
+                    commit_group(connection)
+                result = work(connection, *args)
+            db_results.put((operation, done, result, None))
+        except Exception as e:
+            db_results.put((operation, done, None, e))
+        db_jobs.task_done()
+
+
+def poll_db_results():
+    global form_operation
+    # Ошибку в функции обратного вызова сообщает Tk, следующие результаты всё равно показываются
+    try:
+        while not db_results.empty():
+            operation, done, result, error = db_results.get()
+            if operation is form_operation:
+                form_operation = None
+                save_button.config(state="normal")
+            try:
+                if error:
+                    operation["error"] = str(error)
+                    status_label.config(text=f"❌ Ошибка: {error}")
+                else:
+                    done(result)
+            finally:
+                finish_operation(operation)
+    finally:
+        app.after(20, poll_db_results)
+
+
+def on_table_scroll(first, last):
+    scroll_y.set(first, last)
+    # Следующая страница загружается, когда пользователь приближается к концу
+    if float(last) > 0.9:
+        load_next_page()
+
+
+def delete_rows(connection, record_ids):
+    # Возвращает число удалённых строк. Немногие проходят через построчные триггеры,
+    # начиная с BULK_DELETE их работа делается один раз для всех, как при импорте
+    ids = [(record_id,) for record_id in record_ids]
+    if len(ids) < BULK_DELETE:
+        return connection.executemany("DELETE FROM registry WHERE id=?", ids).rowcount
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS deleted_ids (id INTEGER PRIMARY KEY)")
+    connection.executemany("INSERT OR IGNORE INTO deleted_ids (id) VALUES (?)", ids)
+    for name, create_sql, batch_sql in delete_triggers:
+        connection.execute(f"DROP TRIGGER {name}")
+        connection.execute(batch_sql)
+    deleted = connection.execute("DELETE FROM registry WHERE id IN deleted_ids").rowcount
+    for name, create_sql, batch_sql in delete_triggers:
+        connection.execute(create_sql)
+    connection.execute("DELETE FROM registry_summary WHERE act_count = 0")
+    connection.execute("DELETE FROM deleted_ids")
+    return deleted
 
 
 def delete_record():
@@ -74,137 +1175,909 @@ def delete_record():
     if not selected:
         messagebox.showwarning("Внимание", "Пожалуйста, выберите запись для удаления.")
         return
-    record_id = table.item(selected[0])['values'][0]
-    cursor.execute("DELETE FROM registry WHERE id=?", (record_id,))
-    conn.commit()
-    display_records()
-    status_label.config(text="✅ Успешно удалено!")
+    if len(selected) > 1 and not messagebox.askyesno("Удаление", f"Удалить выбранные записи ({len(selected)})?"):
+        return
+    # Элементы таблицы названы по id их записи
+    record_ids = [int(item) for item in selected]
+    operation = start_operation("удаление")
+    run_db_job(operation, remove_records, (record_ids,),
+               lambda deleted: record_deleted(operation, record_ids, deleted))
+
+
+def remove_records(connection, record_ids):
+    # Все выбранные записи в одной транзакции или одним запросом в режиме клиента
+    if SERVER_URL:
+        return server_request("POST", "/records/delete", {"ids": record_ids})["deleted"]
+    return write_transaction(connection, delete_rows, record_ids)
+
+
+def record_deleted(operation, record_ids, deleted):
+    global view_loaded, view_total
+    # Удалено дважды двойным щелчком, во второй раз строки уже нет
+    items = [record_id for record_id in record_ids if table.exists(record_id)]
+    if items:
+        with timed(operation, "tree"):
+            table.delete(*items)
+        view_loaded -= len(items)
+        if view_total is not None:
+            view_total -= len(items)
+        show_loaded()
+    if editing_id in record_ids:
+        clear_form()
+    operation["rows"] = deleted
+    if len(record_ids) == 1:
+        status_label.config(text="✅ Успешно удалено!")
+    else:
+        status_label.config(text=f"✅ Удалено записей: {deleted}!")
 
 
 def export_to_excel():
-    cursor.execute("SELECT * FROM registry")
-    rows = cursor.fetchall()
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Нотариальный реестр"
-    worksheet.append(columns)
-    for row in rows:
-        worksheet.append(row)
-    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                            filetypes=[("Excel файлы", "*.xlsx")])
+    if task_thread and task_thread.is_alive():
+        return
+    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=EXPORT_FILETYPES)
     if filepath:
-        workbook.save(filepath)
-        messagebox.showinfo("Экспорт", "Данные успешно экспортированы!")
+        start_task(export_worker, filepath)
 
 
-# Приложение
-app = tk.Tk()
-app.title("Нотариальный реестр")
-app.geometry("1280x720")
-app.configure(bg="#2c2f33")
+def export_changes():
+    if task_thread and task_thread.is_alive():
+        return
+    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=EXPORT_FILETYPES)
+    if filepath:
+        start_task(export_worker, filepath, True)
 
-# Шрифты
-font_base = ("Segoe UI", 12)
-font_bold = ("Segoe UI", 12, "bold")
-text_color = "#ffffff"
 
-# -------------- ФОРМА --------------
-form_frame = tk.Frame(app, bg="#2c2f33")
-form_frame.pack(padx=20, pady=20, anchor="nw")
+def import_records():
+    if task_thread and task_thread.is_alive():
+        return
+    filepath = filedialog.askopenfilename(filetypes=[("Excel файлы", "*.xlsx"), ("CSV файлы", "*.csv")])
+    if filepath:
+        start_task(import_worker, filepath)
 
-labels_text = [
-    "Номер документа", "Дата", "ФИО", "Дата рождения", "Персональный ID",
-    "Тип документа", "Государственная пошлина", "Оплата помощи", "Примечания"
-]
-entries = []
-
-act_types = [
-    "Договор купли-продажи",
-    "Договор дарения",
-    "Договор займа",
-    "Договор аренды",
-    "Доверенность",
-    "Завещание",
-    "Сертификат",
-    "Другое"
-]
 
-for i, text in enumerate(labels_text):
-    tk.Label(form_frame, text=text, font=font_base, bg="#2c2f33", fg=text_color)\
-        .grid(row=i, column=0, sticky="w", pady=4)
+def start_task(worker, *args):
+    global task_thread
+    task_cancel.clear()
+    task_thread = threading.Thread(target=worker, args=args, daemon=True)
+    task_thread.start()
+    progress_bar.config(value=0)
+    progress_bar.pack(side="left", padx=10)
+    cancel_button.pack(side="left", padx=10)
+    app.after(100, poll_task)
+
+
+def export_worker(filepath, changes_only=False):
+    # Работает вне потока Tk: никаких виджетов, только сообщения для poll_task()
+    export_conn = connect()
+    export_conn.set_trace_callback(trace_statement)
+    operation = start_operation("экспорт изменений" if changes_only else "экспорт")
+    text_file = None
+    # Пишется рядом с файлом и переименовывается, когда готов, отменённый или неудачный
+    # экспорт оставляет файл, который там был раньше
+    partial_path = filepath + ".part"
+    # CSV и JSON Lines пишутся прямо из каждой порции, намного быстрее, чем книга Excel
+    compressed = filepath.lower().endswith(".gz")
+    export_format = filepath.lower().removesuffix(".gz").rpartition(".")[2]
+    header = columns + ("Удалено",) if changes_only else columns
+    try:
+        if compressed and export_format not in ("csv", "jsonl"):
+            raise ValueError("сжимать можно только экспорт в CSV и JSON Lines")
+        with timed(operation, "sql"):
+            if changes_only:
+                if SERVER_URL:
+                    raise RuntimeError("изменения экспортируются на сервере, из его собственной базы данных")
+                # От последнего экспортированного изменения до самого нового на данный момент,
+                # более поздние изменения остаются для следующего экспорта
+                last_id, newest = export_conn.execute(
+                    "SELECT change_seq, (SELECT ifnull(max(change_seq), 0) FROM registry_changes) "
+                    "FROM registry_export_mark").fetchone()
+                total = export_conn.execute("SELECT count(*) FROM registry_changes WHERE change_seq > ? AND change_seq <= ?",
+                                            (last_id, newest)).fetchone()[0]
+            else:
+                last_id = 0
+                # Каждая запись учтена в registry_summary один раз
+                total = sum(row[2] for row in summary_rows(export_conn))
+        if export_format == "csv":
+            # utf-8-sig, чтобы Excel показывал диакритику, импорт читает его обратно
+            text_file = open_export_file(partial_path, compressed, "utf-8-sig")
+            writer = csv.writer(text_file)
+            writer.writerow(header)
+        elif export_format == "jsonl":
+            # Один объект JSON в строке, ключи — названия столбцов
+            text_file = open_export_file(partial_path, compressed, "utf-8")
+            encode = json.JSONEncoder(ensure_ascii=False).encode
+        else:
+            # openpyxl загружается при первом экспорте или импорте, а не при запуске
+            import openpyxl
+            # Книга только для записи: строки сразу пишутся на диск, а не хранятся в памяти
+            workbook = openpyxl.Workbook(write_only=True)
+            worksheet = workbook.create_sheet("Нотариальный реестр")
+            worksheet.append(header)
+        # Короткие чтения по id (по номеру изменения для изменений), чтобы сохранения из формы не блокировались
+        done = 0
+        while not task_cancel.is_set():
+            with timed(operation, "sql"):
+                if changes_only:
+                    changes = export_conn.execute(CHANGES_QUERY, (last_id, newest, EXPORT_BATCH)).fetchall()
+                    rows = [change[1:] for change in changes]
+                else:
+                    rows = read_page(export_conn, NO_SEARCH, last_id, EXPORT_BATCH)
+            if not rows:
+                if not text_file:
+                    workbook.save(partial_path)
+                else:
+                    text_file.close()
+                os.replace(partial_path, filepath)
+                if changes_only:
+                    # Только когда файл готов, неудавшийся экспорт просто повторяется
+                    write_transaction(export_conn, save_export_mark, newest)
+                operation["rows"] = done
+                finish_operation(operation)
+                task_messages.put(("exported",))
+                return
+            if export_format == "csv":
+                writer.writerows(rows)
+            elif export_format == "jsonl":
+                text_file.writelines(encode(dict(zip(header, row))) + "\n" for row in rows)
+            else:
+                for row in rows:
+                    worksheet.append(row)
+            last_id = changes[-1][0] if changes_only else rows[-1][0]
+            done += len(rows)
+            total = max(total, done)
+            task_messages.put(("progress", done, total, f"📤 Экспорт... {done} / {total}"))
+        if not text_file:
+            worksheet.close()
+        operation["rows"] = done
+        operation["error"] = "отменён"
+        finish_operation(operation)
+        task_messages.put(("stopped", "⛔ Экспорт отменён"))
+    except Exception as e:
+        operation["error"] = str(e)
+        finish_operation(operation)
+        task_messages.put(("error", e))
+    finally:
+        if text_file:
+            text_file.close()
+        export_conn.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
 
-    if text == "Тип документа":
-        combo = ttk.Combobox(form_frame, values=act_types, font=font_base, width=57)
-        combo.grid(row=i, column=1, pady=4, padx=10)
-        combo.set("")  # по умолчанию пусто
-        entries.append(combo)
+
+def save_export_mark(connection, change_seq):
+    connection.execute("UPDATE registry_export_mark SET change_seq = ?", (change_seq,))
+
+
+def open_export_file(filepath, compressed, encoding):
+    # Файл .gz сжимается по мере записи, на обычном для zlib уровне 6:
+    # уровень 9 по умолчанию в gzip в разы медленнее ради файлов на несколько процентов меньше
+    if compressed:
+        return gzip.open(filepath, "wt", compresslevel=6, encoding=encoding, newline="")
+    return open(filepath, "w", encoding=encoding, newline="")
+
+
+def import_worker(filepath):
+    # Работает вне потока Tk: никаких виджетов, только сообщения для poll_task()
+    import_conn = connect()
+    try:
+        rows, total = read_import_file(filepath)
+        records = import_rows(rows)
+        started = time.perf_counter()
+        done = 0
+        while not task_cancel.is_set():
+            batch = list(itertools.islice(records, IMPORT_BATCH))
+            if not batch:
+                rate = done / (time.perf_counter() - started)
+                task_messages.put(("imported", f"✅ Импортировано записей: {done} ({rate:.0f} строк/с)"))
+                return
+            # Одна транзакция на пакет вместо фиксации каждой записи
+            if SERVER_URL:
+                server_request("POST", "/records", {"records": batch})
+            else:
+                write_transaction(import_conn, import_batch, batch)
+            done += len(batch)
+            rate = done / (time.perf_counter() - started)
+            task_messages.put(("progress", done, total,
+                               f"📥 Импорт... {done} / {total or '?'} ({rate:.0f} строк/с)"))
+        task_messages.put(("imported", f"⛔ Импорт отменён после {done} записей"))
+    except Exception as e:
+        task_messages.put(("error", e))
+    finally:
+        import_conn.close()
+
+
+def import_batch(connection, batch):
+    last_id = connection.execute("SELECT ifnull(max(id), 0) FROM registry").fetchone()[0]
+    # Построчные триггеры выполняют свою работу один раз для всей партии,
+    # другие соединения никогда не видят их отсутствующими
+    for name, create_sql, batch_sql in insert_triggers:
+        connection.execute(f"DROP TRIGGER {name}")
+    connection.executemany('''
+        INSERT INTO registry (act_number, date, full_name, birth_date, personal_id,
+                              act_type, state_fee, assistance_payment, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+    for name, create_sql, batch_sql in insert_triggers:
+        connection.execute(batch_sql, (last_id,))
+        connection.execute(create_sql)
+
+
+def read_import_file(filepath):
+    # Возвращает поток строк и их количество, если его можно узнать заранее
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, "rb") as f:
+            total = max(sum(1 for line in f) - 1, 0)
+        return read_csv_rows(filepath), total
+    import openpyxl
+    workbook = openpyxl.load_workbook(filepath, read_only=True)
+    worksheet = workbook.worksheets[0]
+    total = max((worksheet.max_row or 1) - 1, 0)
+    return read_xlsx_rows(workbook, worksheet), total
+
+
+def read_csv_rows(filepath):
+    with open(filepath, newline="", encoding="utf-8-sig") as f:
+        # Во многих региональных настройках Excel пишет ";" вместо ","
+        dialect = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t")
+        f.seek(0)
+        for row in csv.reader(f, dialect):
+            yield tuple(row)
+
+
+def read_xlsx_rows(workbook, worksheet):
+    try:
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def import_rows(rows):
+    # Первая строка содержит названия столбцов. Файлы из export_to_excel()
+    # начинаются со столбца ID, импортированные записи получают новые id
+    header = next(rows, None)
+    skip = 1 if header and str(header[0]).strip().upper() == "ID" else 0
+    for row in rows:
+        values = tuple(import_value(value) for value in row[skip:skip + 9])
+        if any(values):
+            yield values + ("",) * (9 - len(values))
+
+
+def import_value(value):
+    # Ячейки Excel могут содержать числа или даты, реестр хранит текст
+    if value is None:
+        return ""
+    if isinstance(value, datetime.date):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def poll_task():
+    while not task_messages.empty():
+        message = task_messages.get()
+        if message[0] == "progress":
+            if message[2]:
+                progress_bar.config(maximum=message[2], value=message[1])
+            else:
+                progress_bar.step(5)
+            status_label.config(text=message[3])
+            continue
+        progress_bar.pack_forget()
+        cancel_button.pack_forget()
+        if message[0] == "exported":
+            status_label.config(text="")
+            messagebox.showinfo("Экспорт", "Данные успешно экспортированы!")
+        elif message[0] == "imported":
+            status_label.config(text=message[1])
+            search_records()
+        elif message[0] == "stopped":
+            status_label.config(text=message[1])
+        else:
+            status_label.config(text=f"❌ Ошибка: {message[1]}")
+        return
+    app.after(100, poll_task)
+
+
+def cancel_task():
+    task_cancel.set()
+
+
+def show_reports():
+    global reports_window, reports_table
+    if reports_window and reports_window.winfo_exists():
+        reports_window.lift()
     else:
-        entry = tk.Entry(form_frame, width=60, font=font_base, bd=1, relief="solid",
-                         bg="#2c2f33", fg="white", insertbackground="white")
-        entry.grid(row=i, column=1, pady=4, padx=10)
-        entries.append(entry)
+        reports_window = tk.Toplevel(app)
+        reports_window.title("Отчёты")
+        reports_window.geometry("1000x600")
+        reports_window.configure(bg="#2c2f33")
+        tk.Button(reports_window, text="🔄 Обновить", command=show_reports,
+                  bg="#6c757d", fg="white", font=font_bold,
+                  relief="flat", padx=10, pady=3).pack(padx=20, pady=(20, 0), anchor="nw")
+        report_columns = ("Месяц", "Тип документа", "Документы", "Государственная пошлина", "Оплата помощи")
+        reports_table = ttk.Treeview(reports_window, columns=report_columns, show='headings')
+        for col in report_columns:
+            reports_table.heading(col, text=col)
+            reports_table.column(col, width=180, anchor="w")
+        reports_table.pack(padx=20, pady=20, fill="both", expand=True)
 
-tk.Button(form_frame, text="💾 Сохранить", command=save_record,
-          bg="#007BFF", fg="white", font=font_bold,
-          relief="flat", padx=15, pady=5).grid(row=len(labels_text), column=0, columnspan=2, pady=15)
+    # Итоги читаются из registry_summary, по нескольку строк на месяц
+    run_db_job(start_operation("отчёты"), summary_rows, (), fill_reports)
 
-status_label = tk.Label(form_frame, text="", bg="#2c2f33", fg="lightgreen", font=font_base)
-status_label.grid(row=len(labels_text)+1, column=0, columnspan=2)
 
-# -------------- ПОИСК --------------
-search_frame = tk.Frame(app, bg="#2c2f33")
-search_frame.pack(padx=20, anchor="nw")
+def fill_reports(rows):
+    if not reports_window.winfo_exists():
+        return
+    reports_table.delete(*reports_table.get_children())
+    month_total = None
+    for month, act_type, act_count, state_fee, assistance_payment in rows:
+        if month_total and month_total[0] != month:
+            add_report_total(month_total)
+            month_total = None
+        if not month_total:
+            month_total = [month, 0, 0, 0]
+        month_total[1] += act_count
+        month_total[2] += state_fee
+        month_total[3] += assistance_payment
+        reports_table.insert('', 'end', values=(month or "—", act_type or "—", act_count,
+                                                format_minor(state_fee), format_minor(assistance_payment)))
+    if month_total:
+        add_report_total(month_total)
 
-tk.Label(search_frame, text="🔍 Поиск:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
-search_entry = tk.Entry(search_frame, width=40, font=font_base, bd=1, relief="solid",
-                         bg="#444", fg="white", insertbackground="white")
-search_entry.pack(side="left", padx=10)
 
-tk.Button(search_frame, text="Поиск", command=search_records,
-          bg="#28a745", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+def add_report_total(month_total):
+    month, act_count, state_fee, assistance_payment = month_total
+    reports_table.insert('', 'end', values=(month or "—", "Итого", act_count,
+                                            format_minor(state_fee), format_minor(assistance_payment)))
 
-tk.Button(search_frame, text="🗑️ Удалить", command=delete_record,
-          bg="#dc3545", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
 
-tk.Button(search_frame, text="📤 Экспорт", command=export_to_excel,
-          bg="#17a2b8", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+def format_minor(amount):
+    return f"{amount // 100}.{amount % 100:02}"
 
-# -------------- ТАБЛИЦА С ПОЛЗУНКОМ --------------
-table_frame = tk.Frame(app, bg="#2c2f33")
-table_frame.pack(padx=20, pady=20, fill="both", expand=True)
 
-columns = (
-    "ID", "Номер документа", "Дата", "ФИО", "Дата рождения", "Персональный ID",
-    "Тип документа", "Государственная пошлина", "Оплата помощи", "Примечания"
-)
+def show_diagnostics():
+    global diagnostics_window, diagnostics_table, search_cache_label
+    if diagnostics_window and diagnostics_window.winfo_exists():
+        diagnostics_window.lift()
+        return
+    diagnostics_window = tk.Toplevel(app)
+    diagnostics_window.title("Диагностика")
+    diagnostics_window.geometry("1200x600")
+    diagnostics_window.configure(bg="#2c2f33")
+    tk.Label(diagnostics_window, text=f"Операции дольше {SLOW_MS} мс записываются в {SLOW_LOG_PATH}",
+             font=font_base, bg="#2c2f33", fg=text_color).pack(padx=20, pady=(20, 0), anchor="nw")
+    search_cache_label = tk.Label(diagnostics_window, font=font_base, bg="#2c2f33", fg=text_color)
+    search_cache_label.pack(padx=20, pady=(10, 0), anchor="nw")
+    diagnostics_columns = ("Время", "Операция", "Всего мс", "SQL мс", "Таблица мс", "Строки", "Запросы")
+    diagnostics_table = ttk.Treeview(diagnostics_window, columns=diagnostics_columns, show='headings')
+    for col in diagnostics_columns:
+        diagnostics_table.heading(col, text=col)
+        diagnostics_table.column(col, width=150, anchor="w")
+    diagnostics_table.tag_configure("slow", foreground="#ff6b6b")
+    diagnostics_table.pack(padx=20, pady=20, fill="both", expand=True)
+    fill_diagnostics()
+
+
+def fill_diagnostics():
+    # Обновляется каждую секунду, пока окно открыто
+    if not diagnostics_window.winfo_exists():
+        return
+    search_cache_label.config(text=f"Кэш поиска: попаданий {search_cache_hits}, промахов {search_cache_misses}, "
+                                   f"строк {search_cache_rows} из {SEARCH_CACHE_ROWS}")
+    diagnostics_table.delete(*diagnostics_table.get_children())
+    for operation in list(recent_operations):
+        diagnostics_table.insert('', 'end', values=(
+            operation["at"].strftime("%H:%M:%S"), operation["name"], f"{operation['wall'] * 1000:.1f}",
+            f"{operation['sql'] * 1000:.1f}", f"{operation['tree'] * 1000:.1f}", operation["rows"],
+            operation["statements"]), tags=("slow",) if operation["wall"] * 1000 >= SLOW_MS else ())
+    diagnostics_window.after(1000, fill_diagnostics)
 
-scroll_y = tk.Scrollbar(table_frame, orient="vertical")
-scroll_y.pack(side="right", fill="y")
-
-table = ttk.Treeview(table_frame, columns=columns, show='headings', yscrollcommand=scroll_y.set)
-
-style = ttk.Style()
-style.theme_use("default")
-style.configure("Treeview",
-                background="#444",
-                foreground="white",
-                rowheight=25,
-                fieldbackground="#444",
-                font=font_base)
-style.configure("Treeview.Heading",
-                background="#343a40",
-                foreground="white",
-                font=font_bold)
-
-for col in columns:
-    table.heading(col, text=col)
-    table.column(col, width=150, anchor="w")
-
-table.pack(fill="both", expand=True)
-scroll_y.config(command=table.yview)
-
-display_records()
-app.mainloop()
+
+def summary_rows(connection):
+    # Документы и суммы сборов по месяцам и типам документов, сначала новый месяц
+    if SERVER_URL:
+        return server_request("GET", "/stats")["rows"]
+    return connection.execute('''
+        SELECT month, act_type, act_count, state_fee_minor, assistance_payment_minor
+        FROM registry_summary ORDER BY month DESC, act_type
+    ''').fetchall()
+
+
+async def run_server(host, port, readers):
+    global server_readers, server_read_executor, server_writes, server_write_executor, server_write_conn
+    server_readers = asyncio.Queue()
+    for _ in range(readers):
+        server_readers.put_nowait(connect(check_same_thread=False))
+    server_read_executor = concurrent.futures.ThreadPoolExecutor(readers)
+    server_writes = asyncio.Queue(WRITE_QUEUE)
+    server_write_executor = concurrent.futures.ThreadPoolExecutor(1)
+    server_write_conn = connect(check_same_thread=False)
+    # Хранится в переменной, цикл событий держит задачи только по слабой ссылке
+    writer_task = asyncio.create_task(server_writer())
+    server = await asyncio.start_server(handle_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def server_read(work, *args):
+    # Ждёт свободное соединение пула, запрос выполняется в потоке пула
+    connection = await server_readers.get()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(server_read_executor, work, connection, *args)
+    finally:
+        server_readers.put_nowait(connection)
+
+
+async def server_write(work, *args):
+    # Ставится в очередь для server_writer(), ждёт, пока очередь заполнена
+    future = asyncio.get_running_loop().create_future()
+    await server_writes.put((work, args, future))
+    return await future
+
+
+async def server_writer():
+    loop = asyncio.get_running_loop()
+    while True:
+        jobs = [await server_writes.get()]
+        while len(jobs) < WRITE_GROUP and not server_writes.empty():
+            jobs.append(server_writes.get_nowait())
+        try:
+            results = await loop.run_in_executor(server_write_executor, write_transaction, server_write_conn,
+                                                 run_write_jobs, [(work, args) for work, args, future in jobs])
+        except Exception as e:
+            results = [e] * len(jobs)
+        for (work, args, future), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def run_write_jobs(connection, jobs):
+    # У каждого задания своя точка сохранения, неудачное отменяется без остальных
+    results = []
+    for work, args in jobs:
+        connection.execute("SAVEPOINT job")
+        try:
+            results.append(work(connection, *args))
+        except sqlite3.Error as e:
+            connection.execute("ROLLBACK TO job")
+            results.append(e)
+        connection.execute("RELEASE job")
+    return results
+
+
+def insert_records(connection, records):
+    # Одна запись сохраняется как из формы, несколько — как при импорте
+    if len(records) == 1:
+        return [insert_record(connection, records[0])]
+    last_id = connection.execute("SELECT ifnull(max(id), 0) FROM registry").fetchone()[0]
+    import_batch(connection, records)
+    return [row[0] for row in connection.execute("SELECT id FROM registry WHERE id > ? ORDER BY id", (last_id,))]
+
+
+async def handle_client(reader, writer):
+    # HTTP/1.1, запросы одного соединения обрабатываются по очереди, пока оно не закроется
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            await handle_request(writer, method, target, headers, body, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def handle_request(writer, method, target, headers, body, keep_alive):
+    url = urllib.parse.urlsplit(target)
+    query = dict(urllib.parse.parse_qsl(url.query))
+    record_path = re.fullmatch(r"/records/(\d+)", url.path)
+    if SERVER_TOKEN and not hmac.compare_digest(headers.get("authorization", "").encode(),
+                                                f"Bearer {SERVER_TOKEN}".encode()):
+        return await send_json(writer, 401, {"error": "неверный или отсутствующий токен"}, keep_alive)
+    try:
+        if method == "GET" and url.path == "/records":
+            # Страницы не больше EXPORT_BATCH строк, большой результат клиент читает постранично
+            limit = min(max(int(query.get("limit", PAGE_SIZE)), 1), EXPORT_BATCH)
+            rows = await server_read(read_page, request_search(query), request_id(query.get("last_id", 0)), limit)
+            return await send_json(writer, 200, {"rows": rows}, keep_alive)
+        if method == "GET" and url.path == "/count":
+            return await send_json(writer, 200, {"count": await server_read(count_records, request_search(query))},
+                                   keep_alive)
+        if method == "POST" and url.path == "/records":
+            records = [request_record(record) for record in json.loads(body)["records"]]
+            if not records:
+                raise ValueError("нет записей")
+            ids = await server_write(insert_records, records)
+            return await send_json(writer, 200, {"ids": ids}, keep_alive)
+        if method == "PUT" and record_path:
+            record = request_record(json.loads(body)["record"])
+            updated = await server_write(update_row, request_id(record_path.group(1)), record)
+            return await send_json(writer, 200, {"updated": updated}, keep_alive)
+        if method == "DELETE" and record_path:
+            if not await server_write(delete_rows, [request_id(record_path.group(1))]):
+                return await send_json(writer, 404, {"error": f"нет записи {record_path.group(1)}"}, keep_alive)
+            return await send_json(writer, 200, {"deleted": 1}, keep_alive)
+        if method == "POST" and url.path == "/records/delete":
+            record_ids = [request_id(record_id) for record_id in json.loads(body)["ids"]]
+            return await send_json(writer, 200, {"deleted": await server_write(delete_rows, record_ids)}, keep_alive)
+        if method == "GET" and url.path == "/stats":
+            return await send_json(writer, 200, {"rows": await server_read(summary_rows)}, keep_alive)
+        if method == "GET" and url.path == "/export":
+            return await send_export(writer, keep_alive)
+        return await send_json(writer, 404, {"error": f"нет {method} {url.path}"}, keep_alive)
+    except (ValueError, KeyError, TypeError, OverflowError) as e:
+        return await send_json(writer, 400, {"error": str(e)}, keep_alive)
+    except sqlite3.Error as e:
+        return await send_json(writer, 500, {"error": str(e)}, keep_alive)
+
+
+def request_record(values):
+    # 9 значений записи, присланной клиентом: текст или числа, null для пустого поля
+    if not isinstance(values, list) or len(values) != 9:
+        raise ValueError("запись — это список из 9 значений")
+    if any(isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))) for value in values):
+        raise ValueError("значения записи — текст, числа или null")
+    return tuple("" if value is None else str(value) for value in values)
+
+
+def request_id(value):
+    # id записи или last_id, присланный клиентом, целые SQLite 64-битные
+    if isinstance(value, bool):
+        raise ValueError(f"{value} — не id записи")
+    record_id = int(value)
+    if not 0 <= record_id < 2**63:
+        raise ValueError(f"{value} — не id записи")
+    return record_id
+
+
+def request_search(query):
+    # Поиск запроса /records или /count, даты в ISO
+    return (query.get("query", "").strip(), iso_date(query.get("date_from", "")),
+            iso_date(query.get("date_to", "")), query.get("act_type", "").strip())
+
+
+async def send_json(writer, status, data, keep_alive):
+    body = json.dumps(data, ensure_ascii=False).encode()
+    writer.write(response_head(status, "application/json", keep_alive, f"Content-Length: {len(body)}") + body)
+    await writer.drain()
+
+
+async def send_export(writer, keep_alive):
+    # CSV, как у кнопки экспорта, каждая порция отправляется сразу после чтения
+    writer.write(response_head(200, "text/csv; charset=utf-8", keep_alive, "Transfer-Encoding: chunked"))
+    text = io.StringIO()
+    text.write("\ufeff")
+    csv.writer(text).writerow(columns)
+    last_id = 0
+    while True:
+        rows = await server_read(read_page, NO_SEARCH, last_id, EXPORT_BATCH)
+        csv.writer(text).writerows(rows)
+        chunk = text.getvalue().encode()
+        text.seek(0)
+        text.truncate()
+        if chunk:
+            writer.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+        if len(rows) < EXPORT_BATCH:
+            break
+        last_id = rows[-1][0]
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def response_head(status, content_type, keep_alive, length_header):
+    return (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"{length_header}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode()
+
+
+def run_command():
+    # Команды командной строки, выполняются без окна. Возвращает код выхода
+    # Перенаправленный вывод в UTF-8 при любой кодовой странице консоли
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+    if SERVER_URL and arguments.command in ("serve", "vacuum"):
+        arg_parser.error(f"{arguments.command} выполняется на базе данных самого сервера, без --server")
+    if arguments.command == "search":
+        try:
+            search = (arguments.query.strip(), iso_date(arguments.date_from), iso_date(arguments.date_to),
+                      arguments.act_type.strip())
+        except ValueError as e:
+            arg_parser.error(str(e))
+        writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+        writer.writerow(columns)
+        # Те же страницы, что в таблице, читаются одна за другой
+        last_id = 0
+        printed = 0
+        while arguments.limit is None or printed < arguments.limit:
+            limit = PAGE_SIZE if arguments.limit is None else min(PAGE_SIZE, arguments.limit - printed)
+            try:
+                rows = read_page(conn, search, last_id, limit)
+            except (RuntimeError, OSError) as e:
+                print(f"❌ Ошибка: {e}", file=sys.stderr)
+                return 1
+            writer.writerows(rows)
+            printed += len(rows)
+            if len(rows) < limit:
+                break
+            last_id = rows[-1][0]
+        return 0
+
+    if arguments.command in ("export", "import"):
+        if arguments.command == "export":
+            worker, worker_args = export_worker, (arguments.file, arguments.changes)
+        else:
+            worker, worker_args = import_worker, (arguments.file,)
+        # Тот же обработчик, что у кнопок, ход выполнения выводится в stderr
+        thread = threading.Thread(target=worker, args=worker_args, daemon=True)
+        thread.start()
+        while True:
+            try:
+                message = task_messages.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                task_cancel.set()
+                continue
+            if message[0] == "progress":
+                print(f"\r{message[3]}", end="", file=sys.stderr, flush=True)
+                continue
+            print(file=sys.stderr)
+            if message[0] == "exported":
+                print(f"✅ Экспортировано в {arguments.file}", file=sys.stderr)
+                return 0
+            if message[0] in ("imported", "stopped"):
+                print(message[1], file=sys.stderr)
+                return 0 if message[1].startswith("✅") else 1
+            print(f"❌ Ошибка: {message[1]}", file=sys.stderr)
+            return 1
+
+    if arguments.command == "stats":
+        # Читается из registry_summary, как в окне отчётов
+        try:
+            rows = summary_rows(conn)
+        except (RuntimeError, OSError) as e:
+            print(f"❌ Ошибка: {e}", file=sys.stderr)
+            return 1
+        months = {}
+        for month, act_type, act_count, state_fee, assistance_payment in rows:
+            month_total = months.setdefault(month, [0, 0, 0])
+            month_total[0] += act_count
+            month_total[1] += state_fee
+            month_total[2] += assistance_payment
+        print("\t".join(("Месяц", "Документы", "Государственная пошлина", "Оплата помощи")))
+        all_acts = all_state_fee = all_assistance_payment = 0
+        for month, (act_count, state_fee, assistance_payment) in sorted(months.items()):
+            print("\t".join((month or "—", str(act_count), format_minor(state_fee), format_minor(assistance_payment))))
+            all_acts += act_count
+            all_state_fee += state_fee
+            all_assistance_payment += assistance_payment
+        print("\t".join(("Итого", str(all_acts), format_minor(all_state_fee), format_minor(all_assistance_payment))))
+        return 0
+
+    if arguments.command == "vacuum":
+        size = os.path.getsize(DB_PATH)
+        if fts_enabled:
+            conn.execute("INSERT INTO registry_fts (registry_fts) VALUES ('optimize')")
+            conn.commit()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        print(f"{DB_PATH}: {size // 1024} KB -> {os.path.getsize(DB_PATH) // 1024} KB", file=sys.stderr)
+        return 0
+
+    if arguments.command == "serve":
+        print(f"База {DB_PATH} доступна на http://{arguments.host}:{arguments.port}", file=sys.stderr)
+        try:
+            asyncio.run(run_server(arguments.host, arguments.port, arguments.readers))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+
+if __name__ == "__main__":
+    if arguments.command:
+        sys.exit(run_command())
+
+    # Приложение
+    app = tk.Tk()
+    app.title("Нотариальный реестр")
+    app.geometry("1280x720")
+    app.configure(bg="#2c2f33")
+
+    # Шрифты
+    font_base = ("Segoe UI", 12)
+    font_bold = ("Segoe UI", 12, "bold")
+    text_color = "#ffffff"
+
+    # -------------- ФОРМА --------------
+    form_frame = tk.Frame(app, bg="#2c2f33")
+    form_frame.pack(padx=20, pady=20, anchor="nw")
+
+    labels_text = [
+        "Номер документа", "Дата", "ФИО", "Дата рождения", "Персональный ID",
+        "Тип документа", "Государственная пошлина", "Оплата помощи", "Примечания"
+    ]
+    entries = []
+
+    act_types = [
+        "Договор купли-продажи",
+        "Договор дарения",
+        "Договор займа",
+        "Договор аренды",
+        "Доверенность",
+        "Завещание",
+        "Сертификат",
+        "Другое"
+    ]
+
+    for i, text in enumerate(labels_text):
+        tk.Label(form_frame, text=text, font=font_base, bg="#2c2f33", fg=text_color)\
+            .grid(row=i, column=0, sticky="w", pady=4)
+
+        if text == "Тип документа":
+            combo = ttk.Combobox(form_frame, values=act_types, font=font_base, width=57)
+            combo.grid(row=i, column=1, pady=4, padx=10)
+            combo.set("")  # по умолчанию пусто
+            entries.append(combo)
+        else:
+            entry = tk.Entry(form_frame, width=60, font=font_base, bd=1, relief="solid",
+                             bg="#2c2f33", fg="white", insertbackground="white")
+            entry.grid(row=i, column=1, pady=4, padx=10)
+            entries.append(entry)
+
+    save_button = tk.Button(form_frame, text="💾 Сохранить", command=save_record,
+                            bg="#007BFF", fg="white", font=font_bold,
+                            relief="flat", padx=15, pady=5)
+    save_button.grid(row=len(labels_text), column=0, columnspan=2, pady=15)
+
+    status_label = tk.Label(form_frame, text="", bg="#2c2f33", fg="lightgreen", font=font_base)
+    status_label.grid(row=len(labels_text)+1, column=0, columnspan=2)
+
+    # -------------- ПОИСК --------------
+    search_frame = tk.Frame(app, bg="#2c2f33")
+    search_frame.pack(padx=20, anchor="nw")
+
+    tk.Label(search_frame, text="🔍 Поиск:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    search_text = tk.StringVar()
+    search_text.trace_add("write", on_search_typed)
+    search_entry = tk.Entry(search_frame, width=40, font=font_base, bd=1, relief="solid",
+                             bg="#444", fg="white", insertbackground="white", textvariable=search_text)
+    search_entry.pack(side="left", padx=10)
+
+    tk.Button(search_frame, text="Поиск", command=search_records,
+              bg="#28a745", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(search_frame, text="🔄 Обновить", command=refresh_records,
+              bg="#6c757d", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(search_frame, text="🗑️ Удалить", command=delete_record,
+              bg="#dc3545", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(search_frame, text="✏️ Изменить", command=edit_record,
+              bg="#ffc107", fg="black", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(search_frame, text="📤 Экспорт", command=export_to_excel,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    # -------------- ИНСТРУМЕНТЫ --------------
+    tools_frame = tk.Frame(app, bg="#2c2f33")
+    tools_frame.pack(padx=20, pady=(10, 0), anchor="nw")
+
+    tk.Button(tools_frame, text="📤 Экспорт изменений", command=export_changes,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(tools_frame, text="📥 Импорт", command=import_records,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(tools_frame, text="📊 Отчёты", command=show_reports,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(tools_frame, text="⏱ Диагностика", command=show_diagnostics,
+              bg="#6c757d", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    # Видны только во время экспорта или импорта
+    progress_bar = ttk.Progressbar(tools_frame, length=200, mode="determinate")
+    cancel_button = tk.Button(tools_frame, text="✖ Отмена", command=cancel_task,
+                              bg="#6c757d", fg="white", font=font_bold,
+                              relief="flat", padx=10, pady=3)
+
+    # -------------- ФИЛЬТРЫ --------------
+    filter_frame = tk.Frame(app, bg="#2c2f33")
+    filter_frame.pack(padx=20, pady=(10, 0), anchor="nw")
+
+    # Фильтры сужают поиск так же, как ввод текста
+    tk.Label(filter_frame, text="📅 С:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    date_from_text = tk.StringVar()
+    date_from_text.trace_add("write", on_search_typed)
+    date_from_entry = tk.Entry(filter_frame, width=12, font=font_base, bd=1, relief="solid",
+                               bg="#444", fg="white", insertbackground="white", textvariable=date_from_text)
+    date_from_entry.pack(side="left", padx=10)
+
+    tk.Label(filter_frame, text="По:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    date_to_text = tk.StringVar()
+    date_to_text.trace_add("write", on_search_typed)
+    date_to_entry = tk.Entry(filter_frame, width=12, font=font_base, bd=1, relief="solid",
+                             bg="#444", fg="white", insertbackground="white", textvariable=date_to_text)
+    date_to_entry.pack(side="left", padx=10)
+
+    tk.Label(filter_frame, text="Тип документа:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    act_type_text = tk.StringVar()
+    act_type_text.trace_add("write", on_search_typed)
+    act_type_filter = ttk.Combobox(filter_frame, values=["", *act_types], font=font_base, width=20,
+                                   textvariable=act_type_text)
+    act_type_filter.pack(side="left", padx=10)
+
+    loaded_label = tk.Label(filter_frame, text="", font=font_base, bg="#2c2f33", fg=text_color)
+    loaded_label.pack(side="left", padx=20)
+
+    # -------------- ТАБЛИЦА С ПОЛЗУНКОМ --------------
+    table_frame = tk.Frame(app, bg="#2c2f33")
+    table_frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+    scroll_y = tk.Scrollbar(table_frame, orient="vertical")
+    scroll_y.pack(side="right", fill="y")
+
+    table = ttk.Treeview(table_frame, columns=columns, show='headings', yscrollcommand=on_table_scroll)
+
+    style = ttk.Style()
+    style.theme_use("default")
+    style.configure("Treeview",
+                    background="#444",
+                    foreground="white",
+                    rowheight=25,
+                    fieldbackground="#444",
+                    font=font_base)
+    style.configure("Treeview.Heading",
+                    background="#343a40",
+                    foreground="white",
+                    font=font_bold)
+
+    for col in columns:
+        table.heading(col, text=col)
+        table.column(col, width=150, anchor="w")
+
+    table.pack(fill="both", expand=True)
+    scroll_y.config(command=table.yview)
+    table.bind("<Double-1>", lambda event: edit_record())
+    app.bind("<Escape>", lambda event: cancel_edit())
+
+    threading.Thread(target=read_worker, daemon=True).start()
+    app.after(20, poll_reads)
+    threading.Thread(target=db_worker, daemon=True).start()
+    app.after(20, poll_db_results)
+    # Окно рисуется до чтения строк
+    app.update()
+    if STARTUP_TIMING:
+        print("window", flush=True)
+    display_records()
+    app.mainloop()
+    # Сохранения, ещё ждущие в очереди при закрытии окна, записываются перед выходом
+    if GROUP_COMMIT:
+        queue_group_commit()
+    db_jobs.join()
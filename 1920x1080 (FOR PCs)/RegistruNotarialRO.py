@@ -1,11 +1,164 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import openpyxl
+import re
+import threading
+import queue
+import csv
+import gzip
+import io
+import json
+import datetime
+import itertools
+import collections
+import contextlib
+import time
+import configparser
+import logging
+import logging.handlers
+import argparse
+import asyncio
+import concurrent.futures
+import urllib.request
+import urllib.parse
+import urllib.error
+import hmac
+import os
+import sys
+
+# Linia de comandă. Fără comandă se deschide fereastra, cu o comandă scriptul o
+# rulează fără fereastră și se închide, pentru lucrări programate:
+#   python RegistruNotarialRO.py --db registru.db export registru.csv.gz
+parser_argumente = argparse.ArgumentParser(description="Registru Notarial")
+parser_argumente.add_argument("--db", default="registru.db", help="fișierul bazei de date (implicit: registru.db)")
+parser_argumente.add_argument("--server", help="folosește un server de registru (http://gazda:port) în locul fișierului")
+# scrie o linie când fereastra e desenată și alta când apare prima pagină,
+# apoi se închide (benchmarks/startup_benchmark.py)
+parser_argumente.add_argument("--startup-time", action="store_true", help=argparse.SUPPRESS)
+comenzi = parser_argumente.add_subparsers(dest="comanda", metavar="comanda")
+comanda_cautare = comenzi.add_parser("search", help="afișează înregistrările găsite, separate prin tab")
+comanda_cautare.add_argument("valoare", nargs="?", default="", help="textul scris în câmpul de căutare")
+comanda_cautare.add_argument("--from", dest="data_de_la", default="", help="prima dată, zz.ll.aaaa")
+comanda_cautare.add_argument("--to", dest="data_pana_la", default="", help="ultima dată, zz.ll.aaaa")
+comanda_cautare.add_argument("--act-type", dest="tip_act", default="", help="denumirea actului")
+comanda_cautare.add_argument("--limit", type=int, help="afișează cel mult atâtea înregistrări")
+comanda_export = comenzi.add_parser("export", help="exportă toate înregistrările într-un fișier .xlsx, .csv sau .jsonl, "
+                                                          "cu .gz pentru a-l comprima")
+comanda_export.add_argument("fisier")
+comanda_export.add_argument("--changes", dest="modificari", action="store_true",
+                            help="doar înregistrările salvate, modificate sau șterse de la ultimul export al modificărilor")
+comanda_import = comenzi.add_parser("import", help="adaugă înregistrările dintr-un fișier .xlsx sau .csv")
+comanda_import.add_argument("fisier")
+comenzi.add_parser("stats", help="afișează numărul de acte și totalul taxelor pe lună")
+comenzi.add_parser("vacuum", help="optimizează indexul de căutare și compactează baza de date")
+comanda_server = comenzi.add_parser("serve", help="pune baza de date la dispoziția altor calculatoare prin HTTP")
+comanda_server.add_argument("--host", default="127.0.0.1", help="adresa pe care ascultă (implicit: 127.0.0.1)")
+comanda_server.add_argument("--port", type=int, default=8765, help="portul pe care ascultă (implicit: 8765)")
+comanda_server.add_argument("--readers", dest="cititori", type=int, default=4,
+                            help="conexiuni folosite pentru citiri (implicit: 4)")
+argumente = parser_argumente.parse_args()
+
+# Setări, citite din registru.ini de lângă baza de date, dacă există
+setari = configparser.ConfigParser()
+setari.read(os.path.join(os.path.dirname(argumente.db), "registru.ini"), encoding="utf-8")
+# modul partajat e pentru mai multe calculatoare care folosesc aceeași bază de date
+MOD_PARTAJAT = setari.getboolean("database", "shared_mode", fallback=False)
+TIMP_ASTEPTARE = setari.getint("database", "busy_timeout", fallback=5000)
+REINCERCARI_SCRIERE = setari.getint("database", "write_retries", fallback=3)
+# salvare în grup: salvările formularului se confirmă împreună, când GRUP_SALVARI
+# așteaptă sau după GRUP_SALVARI_MS ms fără alta. 0 confirmă fiecare salvare
+GRUP_SALVARI = setari.getint("database", "group_commit", fallback=0)
+GRUP_SALVARI_MS = setari.getint("database", "group_commit_ms", fallback=2000)
+TIMP_PORNIRE = argumente.startup_time
+# salvările, căutările, paginile, ștergerile și exporturile mai lente de atâtea ms se scriu în jurnal
+PRAG_LENT_MS = setari.getint("diagnostics", "slow_ms", fallback=500)
+# tokenul cerut de server și trimis de clienți, niciunul dacă e gol
+TOKEN_SERVER = setari.get("server", "token", fallback="")
+# modul client: înregistrările se citesc și se scriu prin server, baza locală e goală, doar de formă
+URL_SERVER = argumente.server.rstrip("/") if argumente.server else None
 
 # Bază de date
-conn = sqlite3.connect("registru.db")
+BAZA_DATE = ":memory:" if URL_SERVER else argumente.db
+
+def conecteaza(check_same_thread=True):
+    # fiecare fir are conexiunea lui, toate așteaptă cel mult TIMP_ASTEPTARE ms după o blocare
+    conexiune = sqlite3.connect(BAZA_DATE, timeout=TIMP_ASTEPTARE / 1000, check_same_thread=check_same_thread)
+    # NORMAL poate pierde ultimele commituri la o pană de curent, cu salvarea grupată ele cuprind multe salvări
+    if MOD_PARTAJAT and not GRUP_SALVARI:
+        conexiune.execute("PRAGMA synchronous = NORMAL")
+    return conexiune
+
+def tranzactie_scriere(conexiune, functie, *args):
+    # tranzacție scurtă de scriere: blocarea se ia de la început, se ține doar pentru
+    # această operație și se reîncearcă dacă alt calculator o ține peste timpul de așteptare
+    for incercare in range(REINCERCARI_SCRIERE + 1):
+        try:
+            with conexiune:
+                conexiune.execute("BEGIN IMMEDIATE")
+                return functie(conexiune, *args)
+        except sqlite3.OperationalError as e:
+            if incercare == REINCERCARI_SCRIERE or "locked" not in str(e):
+                raise
+            time.sleep(0.2 * (incercare + 1))
+
+# operațiile lente merg în registru-lent.log de lângă baza de date, cel mult 4 fișiere de 1 MB
+FISIER_JURNAL_LENT = os.path.join(os.path.dirname(argumente.db), "registru-lent.log")
+jurnal_lent = logging.getLogger("registru.lent")
+jurnal_lent.propagate = False
+# loggerul rămâne și când scriptul e încărcat din nou în același proces
+if not jurnal_lent.handlers:
+    fisier_jurnal_lent = logging.handlers.RotatingFileHandler(FISIER_JURNAL_LENT, maxBytes=1000000, backupCount=3,
+                                                              encoding="utf-8", delay=True)
+    fisier_jurnal_lent.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    jurnal_lent.addHandler(fisier_jurnal_lent)
+
+# Duratele ultimelor operații, cea mai nouă întâi, pentru fereastra de diagnostic.
+# Fiecare fir notează operația pentru care lucrează, funcția de urmărire a
+# conexiunilor numără instrucțiunile rulate pentru ea
+OPERATII_RECENTE = 200
+INSTRUCTIUNI_JURNAL = 5
+operatii_recente = collections.deque(maxlen=OPERATII_RECENTE)
+urmarire = threading.local()
+
+def incepe_operatie(nume):
+    return {"nume": nume, "la": datetime.datetime.now(), "inceput": time.perf_counter(),
+            "sql": 0.0, "tabel": 0.0, "randuri": 0, "instructiuni": 0, "text_instructiuni": [], "eroare": ""}
+
+@contextlib.contextmanager
+def cronometreaza(operatie, parte):
+    # adaugă timpul petrecut înăuntru la operatie[parte], "sql" sau "tabel"
+    urmarire.operatie = operatie
+    inceput = time.perf_counter()
+    try:
+        yield
+    finally:
+        operatie[parte] += time.perf_counter() - inceput
+        urmarire.operatie = None
+
+def urmareste_instructiune(instructiune):
+    # fiecare instrucțiune rulată pe o conexiune urmărită, inclusiv cele din triggere
+    operatie = getattr(urmarire, "operatie", None)
+    if operatie:
+        operatie["instructiuni"] += 1
+        if len(operatie["text_instructiuni"]) < INSTRUCTIUNI_JURNAL:
+            operatie["text_instructiuni"].append(" ".join(instructiune.split())[:500])
+
+def termina_operatie(operatie):
+    # merge pe orice fir, fereastra de diagnostic citește singură operatii_recente
+    operatie["durata"] = time.perf_counter() - operatie["inceput"]
+    operatii_recente.appendleft(operatie)
+    if operatie["durata"] * 1000 >= PRAG_LENT_MS:
+        jurnal_lent.warning(f"{operatie['nume']} {operatie['durata'] * 1000:.0f} ms: "
+                            f"sql {operatie['sql'] * 1000:.0f} ms, tabel {operatie['tabel'] * 1000:.0f} ms, "
+                            f"{operatie['randuri']} rânduri, {operatie['instructiuni']} instrucțiuni {operatie['eroare']}"
+                            + "".join(f"\n    {text}" for text in operatie["text_instructiuni"]))
+
+conn = conecteaza()
+conn.set_trace_callback(urmareste_instructiune)
 cursor = conn.cursor()
+if MOD_PARTAJAT or argumente.comanda == "serve":
+    # WAL: căutările și exporturile citesc o imagine fixă și nu așteaptă după salvări
+    cursor.execute("PRAGMA journal_mode = WAL")
 cursor.execute('''
     CREATE TABLE IF NOT EXISTS registru (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,185 +175,1818 @@ cursor.execute('''
 ''')
 conn.commit()
 
+# coloanele afișate în tabel și scrise la export, în această ordine
+COLOANE_INREGISTRARE = ("id, nr_act, data, nume_prenume, data_nasterii, idnp, "
+                        "denumire_act, taxa_stat, plata_asistenta, mentiuni")
+coloane = (
+    "ID", "Nr. act", "Data", "Nume și prenume", "Data nașterii", "IDNP",
+    "Denumire act", "Taxă de stat", "Plata asistență", "Mențiuni"
+)
+
+# triggere AFTER INSERT pe rând, fiecare cu o instrucțiune care face același lucru
+# pentru toate rândurile de după un id; importul folosește instrucțiunea, nu triggerul
+triggere_insert = []
+# la fel pentru triggerele AFTER DELETE, instrucțiunea lor rulează pe rândurile din
+# ids_sterse chiar înainte de ștergere; se folosesc de la STERGERE_IN_BLOC înregistrări
+triggere_delete = []
+STERGERE_IN_BLOC = 100
+
+# Index full-text pentru căutare, sincronizat cu tabelul prin triggere
+TRIGGER_FTS_INSERT = '''
+    CREATE TRIGGER IF NOT EXISTS registru_fts_insert AFTER INSERT ON registru BEGIN
+        INSERT INTO registru_fts (rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+        VALUES (new.id, new.nume_prenume, new.data_nasterii, new.idnp, new.nr_act, new.mentiuni);
+    END
+'''
+TRIGGER_FTS_DELETE = '''
+    CREATE TRIGGER IF NOT EXISTS registru_fts_delete AFTER DELETE ON registru BEGIN
+        INSERT INTO registru_fts (registru_fts, rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+        VALUES ('delete', old.id, old.nume_prenume, old.data_nasterii, old.idnp, old.nr_act, old.mentiuni);
+    END
+'''
+cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'registru_fts'")
+fts_nou = cursor.fetchone() is None
+try:
+    cursor.executescript(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS registru_fts USING fts5(
+            nume_prenume, data_nasterii, idnp, nr_act, mentiuni,
+            content='registru', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        {TRIGGER_FTS_INSERT};
+        {TRIGGER_FTS_DELETE};
+        CREATE TRIGGER IF NOT EXISTS registru_fts_update
+        AFTER UPDATE OF nume_prenume, data_nasterii, idnp, nr_act, mentiuni ON registru BEGIN
+            INSERT INTO registru_fts (registru_fts, rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+            VALUES ('delete', old.id, old.nume_prenume, old.data_nasterii, old.idnp, old.nr_act, old.mentiuni);
+            INSERT INTO registru_fts (rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+            VALUES (new.id, new.nume_prenume, new.data_nasterii, new.idnp, new.nr_act, new.mentiuni);
+        END;
+    ''')
+    if fts_nou:
+        # baze de date existente: se indexează înregistrările salvate înainte de index
+        cursor.execute("INSERT INTO registru_fts (registru_fts) VALUES ('rebuild')")
+    conn.commit()
+    triggere_insert.append(("registru_fts_insert", TRIGGER_FTS_INSERT, '''
+        INSERT INTO registru_fts (rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+        SELECT id, nume_prenume, data_nasterii, idnp, nr_act, mentiuni
+        FROM registru WHERE id > ?
+    '''))
+    triggere_delete.append(("registru_fts_delete", TRIGGER_FTS_DELETE, '''
+        INSERT INTO registru_fts (registru_fts, rowid, nume_prenume, data_nasterii, idnp, nr_act, mentiuni)
+        SELECT 'delete', id, nume_prenume, data_nasterii, idnp, nr_act, mentiuni
+        FROM registru WHERE id IN ids_sterse
+    '''))
+    fts_activ = True
+except sqlite3.OperationalError:
+    # SQLite fără FTS5, căutarea revine la LIKE
+    fts_activ = False
+
+
+def sql_data_iso(coloana):
+    # z.l.aaaa sau zz.ll.aaaa (și cu / sau -) și aaaa-l-z sau aaaa-ll-zz devin aaaa-ll-zz,
+    # restul NULL, și o zi pe care luna nu o are. Aceleași date pe care le acceptă data_iso()
+    def doua_cifre(inceput, lungime):
+        # o zi sau o lună, cu 0 în față dacă are o cifră
+        return f"substr('0' || substr(text, {inceput}, {lungime}), -2)"
+    # întâi zz.ll.aaaa, majoritatea datelor se scriu așa
+    cazuri = []
+    for zi, luna in itertools.product((2, 1), repeat=2):
+        for separator in "./-":
+            model = separator.join(("[0-9]" * zi, "[0-9]" * luna, "[0-9]" * 4))
+            cazuri.append(f"WHEN text GLOB '{model}' THEN substr(text, {zi + luna + 3}, 4)"
+                          f" || '-' || {doua_cifre(zi + 2, luna)} || '-' || {doua_cifre(1, zi)}")
+        model = "-".join(("[0-9]" * 4, "[0-9]" * luna, "[0-9]" * zi))
+        cazuri.append(f"WHEN text GLOB '{model}' THEN substr(text, 1, 4)"
+                      f" || '-' || {doua_cifre(6, luna)} || '-' || {doua_cifre(7 + luna, zi)}")
+    # date() mută 31.02 în martie, o dată reală rămâne neschimbată
+    return f'''(SELECT iso FROM (SELECT CASE {" ".join(cazuri)} END AS iso FROM (SELECT trim({coloana}) AS text))
+             WHERE date(iso, '+0 days') = iso)'''
+
+def sql_bani(coloana):
+    # "150", "150.5" sau "1 500,50" devin o sumă întreagă în bani, restul NULL
+    suma = f"replace(replace({coloana}, ' ', ''), ',', '.')"
+    return f'''CASE
+        WHEN {suma} GLOB '*[0-9]*' AND {suma} NOT GLOB '*[^0-9.]*' AND {suma} NOT GLOB '*.*.*'
+            THEN CAST(round(CAST({suma} AS REAL) * 100) AS INTEGER)
+    END'''
+
+def sql_valori_tipizate(rand):
+    # rand e "new." într-un trigger și "" într-o instrucțiune pe tot tabelul
+    return f'''
+        data_iso = {sql_data_iso(rand + "data")},
+        data_nasterii_iso = {sql_data_iso(rand + "data_nasterii")},
+        taxa_stat_bani = {sql_bani(rand + "taxa_stat")},
+        plata_asistenta_bani = {sql_bani(rand + "plata_asistenta")}
+    '''
+
+TRIGGER_TIPIZAT_INSERT = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_tipizat_insert AFTER INSERT ON registru BEGIN
+        UPDATE registru SET {sql_valori_tipizate("new.")} WHERE id = new.id;
+    END
+'''
+
+TRIGGER_TIPIZAT_UPDATE = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_tipizat_update
+    AFTER UPDATE OF data, data_nasterii, taxa_stat, plata_asistenta ON registru BEGIN
+        UPDATE registru SET {sql_valori_tipizate("new.")} WHERE id = new.id;
+    END
+'''
+
+def sql_modificare_sumar(rand, semn):
+    # adaugă (semn 1) sau scade (semn -1) o înregistrare în luna și tipul ei de act
+    return f'''
+        INSERT INTO registru_sumar (luna, denumire_act, numar_acte, taxa_stat_bani, plata_asistenta_bani)
+        VALUES (ifnull(substr({sql_data_iso(rand + "data")}, 1, 7), ''), ifnull({rand}denumire_act, ''), {semn},
+                {semn} * ifnull({sql_bani(rand + "taxa_stat")}, 0),
+                {semn} * ifnull({sql_bani(rand + "plata_asistenta")}, 0))
+        ON CONFLICT (luna, denumire_act) DO UPDATE SET
+            numar_acte = numar_acte + excluded.numar_acte,
+            taxa_stat_bani = taxa_stat_bani + excluded.taxa_stat_bani,
+            plata_asistenta_bani = plata_asistenta_bani + excluded.plata_asistenta_bani;
+    '''
+
+def sql_totaluri_sumar(conditie, semn=1):
+    # adaugă (sau cu semnul -1 scade) înregistrările care respectă condiția, grupate, din coloanele tipizate
+    return f'''
+        INSERT INTO registru_sumar (luna, denumire_act, numar_acte, taxa_stat_bani, plata_asistenta_bani)
+        SELECT ifnull(substr(data_iso, 1, 7), ''), ifnull(denumire_act, ''), {semn} * count(*),
+               {semn} * ifnull(sum(taxa_stat_bani), 0), {semn} * ifnull(sum(plata_asistenta_bani), 0)
+        FROM registru WHERE {conditie}
+        GROUP BY 1, 2
+        ON CONFLICT (luna, denumire_act) DO UPDATE SET
+            numar_acte = numar_acte + excluded.numar_acte,
+            taxa_stat_bani = taxa_stat_bani + excluded.taxa_stat_bani,
+            plata_asistenta_bani = plata_asistenta_bani + excluded.plata_asistenta_bani
+    '''
+
+TRIGGER_SUMAR_INSERT = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_sumar_insert AFTER INSERT ON registru BEGIN
+        {sql_modificare_sumar("new.", 1)}
+    END
+'''
+
+TRIGGER_SUMAR_DELETE = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_sumar_delete AFTER DELETE ON registru BEGIN
+        {sql_modificare_sumar("old.", -1)}
+        DELETE FROM registru_sumar WHERE numar_acte = 0;
+    END
+'''
+
+TRIGGER_SUMAR_UPDATE = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_sumar_update
+    AFTER UPDATE OF data, denumire_act, taxa_stat, plata_asistenta ON registru BEGIN
+        {sql_modificare_sumar("old.", -1)}
+        {sql_modificare_sumar("new.", 1)}
+        DELETE FROM registru_sumar WHERE numar_acte = 0;
+    END
+'''
+
+def sql_modificare_inregistrare(rand, sters):
+    # înregistrarea primește următorul număr de modificare, una ștearsă rămâne ca marcaj
+    return f'''
+        INSERT INTO registru_modificari (id_inregistrare, nr_modificare, sters)
+        VALUES ({rand}id, (SELECT ifnull(max(nr_modificare), 0) + 1 FROM registru_modificari), {sters})
+        ON CONFLICT (id_inregistrare) DO UPDATE SET nr_modificare = excluded.nr_modificare, sters = excluded.sters;
+    '''
+
+TRIGGER_MODIFICARI_INSERT = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_modificari_insert AFTER INSERT ON registru BEGIN
+        {sql_modificare_inregistrare("new.", 0)}
+    END
+'''
+
+TRIGGER_MODIFICARI_DELETE = f'''
+    CREATE TRIGGER IF NOT EXISTS registru_modificari_delete AFTER DELETE ON registru BEGIN
+        {sql_modificare_inregistrare("old.", 1)}
+    END
+'''
+
+# Migrările schemei, PRAGMA user_version este numărul ultimei aplicate.
+# Fiecare migrare e o listă de instrucțiuni, rulate într-o singură tranzacție
+MIGRARI = [
+    # 1: date ISO și taxe în bani lângă textul introdus, pentru intervale și totaluri.
+    # filtrele după interval de date și tip de act folosesc un singur index, data e prima lui coloană
+    [
+        "ALTER TABLE registru ADD COLUMN data_iso TEXT",
+        "ALTER TABLE registru ADD COLUMN data_nasterii_iso TEXT",
+        "ALTER TABLE registru ADD COLUMN taxa_stat_bani INTEGER",
+        "ALTER TABLE registru ADD COLUMN plata_asistenta_bani INTEGER",
+        f"UPDATE registru SET {sql_valori_tipizate('')}",
+        TRIGGER_TIPIZAT_INSERT,
+        TRIGGER_TIPIZAT_UPDATE,
+        "CREATE INDEX registru_data_denumire_act ON registru (data_iso, denumire_act)",
+        "CREATE INDEX registru_data_nasterii_iso ON registru (data_nasterii_iso)",
+        "CREATE INDEX registru_taxa_stat_bani ON registru (taxa_stat_bani)",
+        "CREATE INDEX registru_plata_asistenta_bani ON registru (plata_asistenta_bani)",
+    ],
+    # 2: căutări după IDNP, număr de act și nume
+    [
+        "CREATE INDEX registru_idnp ON registru (idnp)",
+        "CREATE INDEX registru_nr_act ON registru (nr_act)",
+        "CREATE INDEX registru_nume_prenume ON registru (nume_prenume COLLATE NOCASE)",
+    ],
+    # 3: numărul de acte și totalul taxelor pe lună și tip de act, ținute la zi de triggere
+    [
+        '''
+            CREATE TABLE registru_sumar (
+                luna TEXT,
+                denumire_act TEXT,
+                numar_acte INTEGER,
+                taxa_stat_bani INTEGER,
+                plata_asistenta_bani INTEGER,
+                PRIMARY KEY (luna, denumire_act)
+            ) WITHOUT ROWID
+        ''',
+        sql_totaluri_sumar("true"),
+        TRIGGER_SUMAR_INSERT,
+        TRIGGER_SUMAR_DELETE,
+        TRIGGER_SUMAR_UPDATE,
+    ],
+    # 4: numere de modificare și marcaje de ștergere, pentru exportul doar al modificărilor de la ultima dată.
+    # înregistrările salvate înainte sunt toate modificări încă neexportate
+    [
+        '''
+            CREATE TABLE registru_modificari (
+                id_inregistrare INTEGER PRIMARY KEY,
+                nr_modificare INTEGER NOT NULL,
+                sters INTEGER NOT NULL
+            )
+        ''',
+        "CREATE UNIQUE INDEX registru_modificari_nr ON registru_modificari (nr_modificare)",
+        "INSERT INTO registru_modificari (id_inregistrare, nr_modificare, sters) SELECT id, id, 0 FROM registru",
+        TRIGGER_MODIFICARI_INSERT,
+        f'''
+            CREATE TRIGGER registru_modificari_update
+            AFTER UPDATE OF nr_act, data, nume_prenume, data_nasterii, idnp,
+                            denumire_act, taxa_stat, plata_asistenta, mentiuni ON registru BEGIN
+                {sql_modificare_inregistrare("new.", 0)}
+            END
+        ''',
+        TRIGGER_MODIFICARI_DELETE,
+        # ultima modificare scrisă de un export al modificărilor
+        "CREATE TABLE registru_marcaj_export (nr_modificare INTEGER)",
+        "INSERT INTO registru_marcaj_export (nr_modificare) VALUES (0)",
+    ],
+]
+
+def migreaza(conexiune):
+    # se verifică din nou în tranzacție, alt calculator poate să fi migrat deja
+    versiune = conexiune.execute("PRAGMA user_version").fetchone()[0]
+    for numar, instructiuni in enumerate(MIGRARI[versiune:], versiune + 1):
+        for instructiune in instructiuni:
+            conexiune.execute(instructiune)
+        conexiune.execute(f"PRAGMA user_version = {numar}")
+
+if cursor.execute("PRAGMA user_version").fetchone()[0] < len(MIGRARI):
+    tranzactie_scriere(conn, migreaza)
+triggere_insert.append(("registru_tipizat_insert", TRIGGER_TIPIZAT_INSERT,
+                        f"UPDATE registru SET {sql_valori_tipizate('')} WHERE id > ?"))
+# după coloanele tipizate, totalurile se adună din ele
+triggere_insert.append(("registru_sumar_insert", TRIGGER_SUMAR_INSERT, sql_totaluri_sumar("id > ?")))
+triggere_insert.append(("registru_modificari_insert", TRIGGER_MODIFICARI_INSERT, '''
+    INSERT INTO registru_modificari (id_inregistrare, nr_modificare, sters)
+    SELECT id, ultima.nr_modificare + row_number() OVER (ORDER BY id), 0
+    FROM registru, (SELECT ifnull(max(nr_modificare), 0) AS nr_modificare FROM registru_modificari) AS ultima
+    WHERE id > ?
+'''))
+triggere_delete.append(("registru_sumar_delete", TRIGGER_SUMAR_DELETE, sql_totaluri_sumar("id IN ids_sterse", -1)))
+triggere_delete.append(("registru_modificari_delete", TRIGGER_MODIFICARI_DELETE, '''
+    INSERT INTO registru_modificari (id_inregistrare, nr_modificare, sters)
+    SELECT id, ultima.nr_modificare + row_number() OVER (ORDER BY id), 1
+    FROM registru, (SELECT ifnull(max(nr_modificare), 0) AS nr_modificare FROM registru_modificari) AS ultima
+    WHERE id IN ids_sterse
+    ON CONFLICT (id_inregistrare) DO UPDATE SET nr_modificare = excluded.nr_modificare, sters = excluded.sters
+'''))
+
+# Rândurile se afișează pe pagini, următoarea pagină se citește la derulare
+RANDURI_PAGINA = 200
+# câmpul de căutare și filtrele rândurilor afișate: (valoare, data_de_la, data_pana_la, tip_act), date ISO
+FARA_CAUTARE = ("", None, None, "")
+cautare_vedere = FARA_CAUTARE
+ultimul_id = 0
+vedere_completa = False
+pagina_in_asteptare = False
+# durata paginii care se citește, vezi incepe_operatie()
+operatie_vedere = None
+# rândurile din tabel și înregistrările vederii, pentru contorul "Încărcate N din M"
+incarcate_vedere = 0
+total_vedere = None
+
+# Rândurile tabelului sunt citite de un fir separat, cu conexiunea lui, și vin
+# înapoi în bucăți mici. Fiecare vedere nouă primește o generație nouă, așa că
+# rândurile unei interogări vechi sunt ignorate, iar SQL-ul ei întrerupt.
+RANDURI_BUCATA = 50
+# bucățile se adaugă în tabel cel mult BUGET_TABEL ms odată, apoi Tk are
+# PAUZA_TABEL ms să redeseneze fereastra și să răspundă utilizatorului
+BUGET_TABEL = 30
+PAUZA_TABEL = 10
+conn_citire = conecteaza(check_same_thread=False)
+conn_citire.set_trace_callback(urmareste_instructiune)
+cereri_citire = queue.Queue()
+rezultate_citire = queue.Queue()
+generatie_vedere = 0
+
+# Paginile și numărătorile căutărilor recente, după căutare și pagină; cele folosite
+# de cel mai mult timp pleacă primele peste RANDURI_CACHE_CAUTARE rânduri. PRAGMA
+# data_version a conexiunii de citire se schimbă la fiecare confirmare a altei conexiuni,
+# aici sau pe alt calculator, și atunci cache-ul se golește. Nu se folosește în modul client
+RANDURI_CACHE_CAUTARE = 10000
+cache_cautari = collections.OrderedDict()
+randuri_memorate = 0
+versiune_cache = None
+cautari_memorate_gasite = 0
+cautari_memorate_ratate = 0
+
+# Salvările, editările, ștergerile și rapoartele ferestrei sunt lucrări pentru firul
+# bazei de date, care are conexiunea lui și le rulează pe rând. O bază de date blocată
+# sau un server lent nu mai îngheață fereastra, vezi ruleaza_in_bd()
+lucrari_bd = queue.Queue()
+rezultate_bd = queue.Queue()
+# salvarea formularului care se scrie, formularul o așteaptă
+operatie_formular = None
+# salvările din tranzacția deschisă a grupului, folosite doar pe firul bazei de date
+salvari_grup = 0
+
+# Căutarea pornește în timpul tastării, după o pauză de INTARZIERE_CAUTARE ms
+INTARZIERE_CAUTARE = 250
+timer_cautare = None
+
+# Un IDNP complet se caută exact, ce arată a număr de act ("125", "125/2024")
+# după prefix, pe indexuri. Datele și numele merg la căutarea full-text,
+# cifrele cu / sau - ("1985", "15/03/1980") pot fi un număr de act sau o dată a nașterii
+MODEL_IDNP = re.compile(r"\d{13}")
+MODEL_NR_ACT = re.compile(r"\d[\w/-]*")
+MODEL_DATA = re.compile(r"\d[\d/-]*")
+
+# Rânduri citite odată din baza de date la export
+RANDURI_EXPORT = 5000
+
+# Exportul modificărilor: înregistrările modificate după un număr de modificare, în ordine. o
+# înregistrare ștearsă e un rând doar cu ID-ul ei și coloana Șters pe 1
+INTEROGARE_MODIFICARI = f'''
+    SELECT nr_modificare, id_inregistrare, {COLOANE_INREGISTRARE.replace("id, ", "", 1)}, sters
+    FROM registru_modificari LEFT JOIN registru ON registru.id = registru_modificari.id_inregistrare
+    WHERE nr_modificare > ? AND nr_modificare <= ? ORDER BY nr_modificare LIMIT ?
+'''
+# oferite de ambele butoane de export
+TIPURI_EXPORT = [("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("JSON Lines files", "*.jsonl"),
+                 ("Compressed CSV files", "*.csv.gz"), ("Compressed JSON Lines files", "*.jsonl.gz")]
+
+# Rânduri scrise într-o singură tranzacție la import
+RANDURI_IMPORT = 50000
+
+# Exportul și importul rulează pe rând într-un fir separat, cu conexiunea lor,
+# și raportează printr-o coadă
+fir_lucru = None
+lucru_anulat = threading.Event()
+mesaje_lucru = queue.Queue()
+
+fereastra_rapoarte = None
+fereastra_diagnostic = None
+
+# Modul server ("serve"): un singur proces deține baza de date pentru calculatoarele client.
+# Citirile folosesc un grup de conexiuni, scrierile așteaptă într-o coadă după singurul
+# scriitor, care salvează tot ce așteaptă (cel mult GRUP_SCRIERI) într-o singură tranzacție
+COADA_SCRIERI = 1000
+GRUP_SCRIERI = 100
+MOTIVE_HTTP = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+               500: "Internal Server Error"}
+conexiuni_citire_server = None
+executor_citire_server = None
+scrieri_server = None
+executor_scriere_server = None
+conn_scriere_server = None
+
+# înregistrarea încărcată în formular de "Editează", salvată peste ea însăși în loc de una nouă
+id_editat = None
+
 # Funcții
 def salveaza():
+    global operatie_formular
+    if operatie_formular:
+        return
     valori = tuple(entry.get().strip() for entry in entries)
-    try:
-        cursor.execute('''
-            INSERT INTO registru (nr_act, data, nume_prenume, data_nasterii, idnp,
-                                  denumire_act, taxa_stat, plata_asistenta, mentiuni)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', valori)
-        conn.commit()
+    if id_editat is not None:
+        operatie = operatie_formular = incepe_operatie("editare")
+        id_inregistrare = id_editat
+        ruleaza_in_bd(operatie, scrie_editarea, (id_inregistrare, valori),
+                      lambda actualizate: editare_salvata(operatie, id_inregistrare, valori, actualizate))
+    else:
+        operatie = operatie_formular = incepe_operatie("salvare")
+        ruleaza_in_bd(operatie, scrie_inregistrarea, (valori,),
+                      lambda id_nou: inregistrare_salvata(operatie, valori, id_nou))
+    buton_salvare.config(state="disabled")
+
+def scrie_inregistrarea(conexiune, valori):
+    global salvari_grup
+    if URL_SERVER:
+        return cerere_server("POST", "/records", {"records": [valori]})["ids"][0]
+    if not GRUP_SALVARI:
+        return tranzactie_scriere(conexiune, insereaza, valori)
+    # tranzacția rămâne deschisă pentru următoarele salvări, vezi confirma_grupul()
+    if not conexiune.in_transaction:
+        conexiune.execute("BEGIN IMMEDIATE")
+    id_nou = insereaza(conexiune, valori)
+    salvari_grup += 1
+    if salvari_grup >= GRUP_SALVARI:
+        confirma_grupul(conexiune)
+    return id_nou
+
+def confirma_grupul(conexiune):
+    # întoarce salvările confirmate. dacă confirmarea eșuează, ele rămân în
+    # tranzacție și următoarea confirmare încearcă din nou
+    global salvari_grup
+    if conexiune.in_transaction:
+        conexiune.commit()
+    salvari, salvari_grup = salvari_grup, 0
+    return salvari
+
+def salveaza_grupul():
+    operatie = incepe_operatie("confirmare grup")
+    ruleaza_in_bd(operatie, confirma_grupul, (), lambda salvari: operatie.update(randuri=salvari))
+
+def inregistrare_salvata(operatie, valori, id_nou):
+    global ultimul_id, incarcate_vedere, total_vedere
+    operatie["randuri"] = 1
+    status_label.config(text="✅ Salvat!")
+
+    #se adaugă doar rândul nou, și doar dacă lista încărcată s-a terminat
+    if not any(cautare_vedere) and vedere_completa and not pagina_in_asteptare and not tabel.exists(id_nou):
+        with cronometreaza(operatie, "tabel"):
+            tabel.insert('', 'end', iid=id_nou, values=(id_nou, *valori))
+            tabel.see(id_nou)
+        ultimul_id = id_nou
+        incarcate_vedere += 1
+    if not any(cautare_vedere) and total_vedere is not None:
+        total_vedere += 1
+    arata_incarcate()
+
+    goleste_formular()
+
+def insereaza(conexiune, valori):
+    return conexiune.execute('''
+        INSERT INTO registru (nr_act, data, nume_prenume, data_nasterii, idnp,
+                              denumire_act, taxa_stat, plata_asistenta, mentiuni)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', valori).lastrowid
+
+def editeaza():
+    if operatie_formular:
+        return
+    selected = tabel.selection()
+    if not selected:
+        messagebox.showwarning("Atenție", "Selectează o înregistrare de editat.")
+        return
+    id_inregistrare = tabel.item(selected[0])['values'][0]
+    #se citește din nou după id, valorile din tabel pierd zerourile de la începutul numerelor
+    ruleaza_in_bd(incepe_operatie("deschidere pentru editare"), citeste_pagina,
+                  (FARA_CAUTARE, id_inregistrare - 1, 1), lambda rows: completeaza_formular(id_inregistrare, rows))
+
+def completeaza_formular(id_inregistrare, rows):
+    global id_editat
+    if operatie_formular:
+        return
+    if not rows or rows[0][0] != id_inregistrare:
+        status_label.config(text="❌ Înregistrarea a fost ștearsă între timp")
+        return
+    goleste_formular()
+    for entry, valoare in zip(entries, rows[0][1:]):
+        if isinstance(entry, ttk.Combobox):
+            entry.set(valoare or "")
+        else:
+            entry.insert(0, valoare or "")
+    id_editat = id_inregistrare
+    buton_salvare.config(text="💾 Salvează modificările")
+    status_label.config(text=f"✏️ Se editează înregistrarea {id_inregistrare}, Esc pentru anulare")
+
+def scrie_editarea(conexiune, id_inregistrare, valori):
+    if URL_SERVER:
+        return cerere_server("PUT", f"/records/{id_inregistrare}", {"record": valori})["updated"]
+    return tranzactie_scriere(conexiune, actualizeaza_rand, id_inregistrare, valori)
+
+def editare_salvata(operatie, id_inregistrare, valori, actualizate):
+    global incarcate_vedere, total_vedere
+    operatie["randuri"] = actualizate
+    if actualizate:
+        #se redesenează doar rândul editat, id-ul și restul tabelului rămân cum sunt
+        if tabel.exists(id_inregistrare):
+            with cronometreaza(operatie, "tabel"):
+                tabel.item(id_inregistrare, values=(id_inregistrare, *valori))
         status_label.config(text="✅ Salvat!")
-        afiseaza()
+    else:
+        #ștearsă de pe alt calculator, rândul ei dispare și el
+        if tabel.exists(id_inregistrare):
+            tabel.delete(id_inregistrare)
+            incarcate_vedere -= 1
+        if total_vedere is not None:
+            total_vedere -= 1
+        arata_incarcate()
+        status_label.config(text="❌ Înregistrarea a fost ștearsă între timp")
+    goleste_formular()
 
-        #curăță câmpurile după salvare
-        for entry in entries:
-            if isinstance(entry, tk.Entry):
-                entry.delete(0, tk.END)
-            elif isinstance(entry, ttk.Combobox):
-                entry.set("")
+def actualizeaza_rand(conexiune, id_inregistrare, valori):
+    # triggerele aduc la zi coloanele tipizate, indexul de căutare, totalurile și modificările
+    return conexiune.execute('''
+        UPDATE registru SET nr_act = ?, data = ?, nume_prenume = ?, data_nasterii = ?, idnp = ?,
+                            denumire_act = ?, taxa_stat = ?, plata_asistenta = ?, mentiuni = ?
+        WHERE id = ?
+    ''', (*valori, id_inregistrare)).rowcount
 
-    except Exception as e:
-        status_label.config(text=f"❌ Eroare: {e}")
+def anuleaza_editarea():
+    if id_editat is not None and not operatie_formular:
+        goleste_formular()
+        status_label.config(text="")
 
+def goleste_formular():
+    global id_editat
+    id_editat = None
+    buton_salvare.config(text="💾 Salvează")
+    for entry in entries:
+        if isinstance(entry, tk.Entry):
+            entry.delete(0, tk.END)
+        elif isinstance(entry, ttk.Combobox):
+            entry.set("")
 
 def cauta():
-    valoare = entry_cautare.get().strip()
-    for row in tabel.get_children():
-        tabel.delete(row)
-    cursor.execute("""
-        SELECT * FROM registru WHERE 
-            nume_prenume LIKE ? OR 
-            data_nasterii LIKE ? OR 
-            idnp LIKE ? OR 
-            nr_act LIKE ?
-    """, (f"%{valoare}%",)*4)
-    for row in cursor.fetchall():
-        tabel.insert('', 'end', values=row)
+    global timer_cautare, pagina_in_asteptare, operatie_vedere
+    if timer_cautare:
+        app.after_cancel(timer_cautare)
+        timer_cautare = None
+    data_de_la = data_filtru(entry_data_de_la)
+    data_pana_la = data_filtru(entry_data_pana_la)
+    if data_de_la is False or data_pana_la is False:
+        # tastarea a oprit citirile listei afișate, ce s-a încărcat rămâne
+        # și pagina următoare se citește din nou la derulare
+        opreste_citiri()
+        if operatie_vedere:
+            operatie_vedere["eroare"] = "anulat"
+            termina_operatie(operatie_vedere)
+            operatie_vedere = None
+        pagina_in_asteptare = False
+        return
+    arata((entry_cautare.get().strip(), data_de_la, data_pana_la, filtru_tip_act.get().strip()), "căutare")
+
+def conditie_cautare(valoare, data_de_la=None, data_pana_la=None, tip_act=""):
+    # condiția WHERE și parametrii unei căutări, datele sunt ISO
+    conditii = []
+    parametri = {}
+    # intervalul de date și tipul actului, căutate împreună pe registru_data_denumire_act
+    filtre = []
+    if data_de_la:
+        filtre.append("data_iso >= :data_de_la")
+        parametri["data_de_la"] = data_de_la
+    if data_pana_la:
+        filtre.append("data_iso <= :data_pana_la")
+        parametri["data_pana_la"] = data_pana_la
+    if tip_act:
+        filtre.append("denumire_act = :tip_act")
+        parametri["tip_act"] = tip_act
+    if filtre:
+        conditii.append(f"id IN (SELECT id FROM registru WHERE {' AND '.join(filtre)})")
+
+    if not valoare:
+        pass
+    elif MODEL_IDNP.fullmatch(valoare):
+        conditii.append("id IN (SELECT id FROM registru WHERE idnp = :valoare)")
+        parametri["valoare"] = valoare
+    elif MODEL_NR_ACT.fullmatch(valoare):
+        # fără filtre fiecare parte se citește câte o pagină, ca la căutarea full-text de mai jos.
+        # prefixele se citesc pe indexurile lor și se sortează (+id), o parcurgere a tabelului
+        # în ordinea id-urilor ar trece prin aproape tot tabelul pentru un prefix rar
+        pagina = "" if conditii else "AND id > :last_id ORDER BY +id LIMIT :limit"
+        pagina_rowid = "" if conditii else "AND rowid > :last_id ORDER BY rowid LIMIT :limit"
+        parti = [f"SELECT id FROM registru WHERE nr_act >= :valoare AND nr_act < :valoare_sfarsit {pagina}"]
+        # doar cifrele pot fi și începutul unui IDNP
+        if valoare.isdigit():
+            parti.append(f"SELECT id FROM registru WHERE idnp >= :valoare AND idnp < :valoare_sfarsit {pagina}")
+        # sau un an, o zi ori toată data nașterii. doar cuvinte întregi,
+        # prefixul unui număr e începutul majorității datelor din index
+        if MODEL_DATA.fullmatch(valoare):
+            if fts_activ:
+                parti.append(f"SELECT rowid AS id FROM registru_fts WHERE registru_fts MATCH :match {pagina_rowid}")
+                parametri["match"] = f'"{valoare}"'
+            else:
+                parti.append(f"SELECT id FROM registru WHERE data_nasterii LIKE :data_nasterii {pagina_rowid}")
+                parametri["data_nasterii"] = f"%{valoare}%"
+        # o parte cu propriul LIMIT trebuie să fie o subinterogare în UNION ALL
+        conditie = " UNION ALL ".join(f"SELECT id FROM ({parte})" for parte in parti)
+        conditii.append(f"id IN ({conditie})")
+        parametri.update(valoare=valoare, valoare_sfarsit=sfarsit_prefix(valoare))
+    elif fts_activ:
+        # fără filtre indexul se citește câte o pagină, cu filtre o pagină
+        # de potriviri ar putea avea mai puține rânduri decât o pagină
+        pagina = "" if conditii else "AND rowid > :last_id ORDER BY rowid LIMIT :limit"
+        conditii.append(f"""
+            id IN (SELECT rowid FROM registru_fts
+                   WHERE registru_fts MATCH :match {pagina})
+        """)
+        parametri["match"] = interogare_fts(valoare)
+    else:
+        conditii.append("""(
+            nume_prenume LIKE :valoare OR 
+            data_nasterii LIKE :valoare OR 
+            idnp LIKE :valoare OR 
+            nr_act LIKE :valoare
+        )""")
+        parametri["valoare"] = f"%{valoare}%"
+    return " AND ".join(conditii), parametri
+
+def data_filtru(entry):
+    # câmpul gol înseamnă fără limită; o dată încă incompletă
+    # colorează câmpul în roșu și oprește căutarea
+    entry.config(bg="#444")
+    try:
+        return data_iso(entry.get())
+    except ValueError:
+        entry.config(bg="#8b1a1a")
+        return False
+
+def data_iso(text):
+    # aceleași formate ca în sql_data_iso(), None pentru un text gol
+    text = text.strip()
+    if not text:
+        return None
+    for format_data in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(text, format_data).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"nu este o dată: {text}")
+
+def interogare_fts(text):
+    # fiecare cuvânt se caută ca prefix, toate cuvintele trebuie să existe
+    return " ".join('"' + cuvant.replace('"', '""') + '"*' for cuvant in text.split())
+
+def sfarsit_prefix(text):
+    # primul șir de după toate șirurile care încep cu text
+    return text[:-1] + chr(ord(text[-1]) + 1)
 
 def afiseaza():
-    for row in tabel.get_children():
-        tabel.delete(row)
-    cursor.execute("SELECT * FROM registru")
-    for row in cursor.fetchall():
-        tabel.insert('', 'end', values=row)
+    arata()
+
+def reincarca():
+    entry_cautare.delete(0, tk.END)
+    entry_data_de_la.delete(0, tk.END)
+    entry_data_pana_la.delete(0, tk.END)
+    filtru_tip_act.set("")
+    cauta()
+
+def la_tastare(*args):
+    global timer_cautare
+    # interogarea pentru textul anterior se oprește imediat,
+    # cea nouă pornește când tastarea face o pauză
+    opreste_citiri()
+    if timer_cautare:
+        app.after_cancel(timer_cautare)
+    timer_cautare = app.after(INTARZIERE_CAUTARE, cauta)
+
+def opreste_citiri():
+    global generatie_vedere
+    generatie_vedere += 1
+    conn_citire.interrupt()
+
+def arata(cautare=FARA_CAUTARE, nume_operatie="afișare"):
+    global cautare_vedere, ultimul_id, vedere_completa, pagina_in_asteptare, operatie_vedere
+    global incarcate_vedere, total_vedere
+    opreste_citiri()
+    # măsurată până apare prima pagină, inclusiv golirea tabelului
+    operatie_vedere = incepe_operatie(nume_operatie)
+    with cronometreaza(operatie_vedere, "tabel"):
+        tabel.delete(*tabel.get_children())
+    cautare_vedere = cautare
+    ultimul_id = 0
+    vedere_completa = False
+    pagina_in_asteptare = False
+    incarcate_vedere = 0
+    total_vedere = None
+    arata_incarcate()
+    incarca_pagina()
+    # se numără după ce prima pagină e citită, ca să nu o întârzie
+    cereri_citire.put((generatie_vedere, cautare, None, None))
+
+def incarca_pagina():
+    # paginare după cheie: se citesc doar rândurile de după ultimul afișat
+    global pagina_in_asteptare, operatie_vedere
+    if vedere_completa or pagina_in_asteptare:
+        return
+    pagina_in_asteptare = True
+    if not operatie_vedere:
+        operatie_vedere = incepe_operatie("pagina următoare")
+    cereri_citire.put((generatie_vedere, cautare_vedere, ultimul_id, operatie_vedere))
+
+def interogare_pagina(conditie):
+    # următoarele :limit rânduri de după :last_id care respectă condiția
+    conditie = f"AND ({conditie})" if conditie else ""
+    return f"SELECT {COLOANE_INREGISTRARE} FROM registru WHERE id > :last_id {conditie} ORDER BY id LIMIT :limit"
+
+def citeste_pagina(conexiune, cautare, ultimul, limita):
+    # următoarele limita rânduri ale unei căutări de după ultimul, de la server în modul client
+    if URL_SERVER:
+        return cerere_server("GET", url_cautare("/records", cautare, last_id=ultimul, limit=limita))["rows"]
+    conditie, parametri = conditie_cautare(*cautare)
+    return conexiune.execute(interogare_pagina(conditie),
+                             {**parametri, "last_id": ultimul, "limit": limita}).fetchall()
+
+def numara_inregistrari(conexiune, cautare):
+    # câte înregistrări găsește o căutare, toate sunt numărate în registru_sumar
+    if URL_SERVER:
+        return cerere_server("GET", url_cautare("/count", cautare))["count"]
+    if not any(cautare):
+        return sum(rand[2] for rand in randuri_sumar(conexiune))
+    conditie, parametri = conditie_cautare(*cautare)
+    # căutarea în text fără filtre e paginată după rowid, aici se citește până la capăt
+    return conexiune.execute(f"SELECT count(*) FROM registru WHERE {conditie}",
+                             {**parametri, "last_id": 0, "limit": -1}).fetchone()[0]
+
+def url_cautare(cale, cautare, **parametri):
+    # modul client: cererea unei căutări, serverul o citește înapoi cu cautare_cerere()
+    valoare, data_de_la, data_pana_la, tip_act = cautare
+    return cale + "?" + urllib.parse.urlencode({
+        "query": valoare, "date_from": data_de_la or "", "date_to": data_pana_la or "", "act_type": tip_act,
+        **parametri})
+
+def cerere_server(metoda, cale, date=None):
+    # modul client: o cerere către serverul de registru, JSON în ambele sensuri
+    cerere = urllib.request.Request(URL_SERVER + cale, method=metoda,
+                                    data=None if date is None else json.dumps(date).encode(),
+                                    headers={"Content-Type": "application/json",
+                                             "Authorization": f"Bearer {TOKEN_SERVER}"})
+    try:
+        with urllib.request.urlopen(cerere, timeout=60) as raspuns:
+            return json.load(raspuns)
+    except urllib.error.HTTPError as e:
+        # serverul spune în corpul răspunsului ce nu a mers, un proxy dintre ele poate răspunde cu o pagină
+        try:
+            mesaj = json.load(e)["error"]
+        except (ValueError, KeyError, TypeError):
+            mesaj = f"{e.code} {e.reason}"
+        raise RuntimeError(mesaj) from None
+    except urllib.error.URLError as e:
+        # niciun server la adresa asta, sau rețeaua a căzut
+        raise RuntimeError(f"{URL_SERVER} nu poate fi contactat: {e.reason}") from None
+    except ValueError:
+        raise RuntimeError(f"{URL_SERVER} nu a răspuns ca un server de registru") from None
+
+def fir_citire():
+    # rulează pe firul de citire, nu atinge widgeturile
+    while True:
+        generatie, cautare, ultimul, operatie = cereri_citire.get()
+        if generatie != generatie_vedere:
+            continue
+        if ultimul is None:
+            try:
+                numar = cautare_memorata((cautare, None))
+                if numar is None:
+                    numar = numara_inregistrari(conn_citire, cautare)
+                    memoreaza_cautarea((cautare, None), numar, 1)
+                rezultate_citire.put(("numar", generatie, numar))
+            except (sqlite3.Error, OSError, RuntimeError):
+                # întreruptă de o vedere mai nouă, sau fără răspuns: contorul nu arată totalul
+                pass
+            continue
+        cursor_citire = conn_citire.cursor()
+        try:
+            with cronometreaza(operatie, "sql"):
+                if URL_SERVER:
+                    rows = citeste_pagina(None, cautare, ultimul, RANDURI_PAGINA)
+                else:
+                    rows = cautare_memorata((cautare, ultimul))
+                if rows is not None:
+                    bucati = (rows[i:i + RANDURI_BUCATA] for i in range(0, len(rows), RANDURI_BUCATA))
+                else:
+                    conditie, parametri = conditie_cautare(*cautare)
+                    cursor_citire.execute(interogare_pagina(conditie),
+                                          {**parametri, "last_id": ultimul, "limit": RANDURI_PAGINA})
+                    bucati = iter(lambda: cursor_citire.fetchmany(RANDURI_BUCATA), [])
+                pagina = []
+                for bucata in bucati:
+                    if generatie != generatie_vedere:
+                        break
+                    pagina += bucata
+                    rezultate_citire.put(("randuri", generatie, bucata))
+                else:
+                    # se păstrează doar o pagină citită până la capăt
+                    if rows is None:
+                        memoreaza_cautarea((cautare, ultimul), pagina, len(pagina))
+            rezultate_citire.put(("sfarsit", generatie, len(pagina)))
+        except (sqlite3.Error, OSError, RuntimeError) as e:
+            # o interogare întreruptă aparține unei vederi care nu mai există
+            rezultate_citire.put(("eroare", generatie, e))
+        finally:
+            cursor_citire.close()
+
+def cautare_memorata(cheie):
+    # rulează pe firul de citire: rândurile sau numărul memorate pentru cheie, None dacă nu sunt
+    global randuri_memorate, versiune_cache, cautari_memorate_gasite, cautari_memorate_ratate
+    if URL_SERVER:
+        return None
+    versiune = conn_citire.execute("PRAGMA data_version").fetchone()[0]
+    if versiune != versiune_cache:
+        cache_cautari.clear()
+        randuri_memorate = 0
+        versiune_cache = versiune
+    if cheie not in cache_cautari:
+        cautari_memorate_ratate += 1
+        return None
+    cautari_memorate_gasite += 1
+    cache_cautari.move_to_end(cheie)
+    return cache_cautari[cheie][0]
+
+def memoreaza_cautarea(cheie, rezultat, randuri):
+    global randuri_memorate
+    if URL_SERVER:
+        return
+    cache_cautari[cheie] = (rezultat, randuri)
+    randuri_memorate += randuri
+    while randuri_memorate > RANDURI_CACHE_CAUTARE:
+        randuri_memorate -= cache_cautari.popitem(last=False)[1][1]
+
+def verifica_citiri():
+    global ultimul_id, vedere_completa, pagina_in_asteptare, operatie_vedere, incarcate_vedere, total_vedere
+    termen = time.perf_counter() + BUGET_TABEL / 1000
+    while not rezultate_citire.empty():
+        tip, generatie, date = rezultate_citire.get()
+        if generatie != generatie_vedere:
+            continue
+        if tip == "randuri":
+            with cronometreaza(operatie_vedere, "tabel"):
+                for row in date:
+                    tabel.insert('', 'end', iid=row[0], values=row)
+            ultimul_id = date[-1][0]
+            incarcate_vedere += len(date)
+            arata_incarcate()
+        elif tip == "numar":
+            total_vedere = date
+            arata_incarcate()
+        elif tip == "sfarsit":
+            pagina_in_asteptare = False
+            vedere_completa = date < RANDURI_PAGINA
+            operatie_vedere["randuri"] = date
+            termina_operatie(operatie_vedere)
+            operatie_vedere = None
+            if TIMP_PORNIRE:
+                print("first page", flush=True)
+                app.quit()
+        else:
+            pagina_in_asteptare = False
+            operatie_vedere["eroare"] = str(date)
+            termina_operatie(operatie_vedere)
+            operatie_vedere = None
+            status_label.config(text=f"❌ Eroare: {date}")
+        if time.perf_counter() > termen:
+            break
+    #bucățile rămase se adaugă după ce fereastra a fost redesenată
+    app.after(PAUZA_TABEL if not rezultate_citire.empty() else 20, verifica_citiri)
+
+def arata_incarcate():
+    if total_vedere is None:
+        eticheta_incarcate.config(text=f"Încărcate {incarcate_vedere}")
+    else:
+        eticheta_incarcate.config(text=f"Încărcate {incarcate_vedere} din {max(total_vedere, incarcate_vedere)}")
+
+def ruleaza_in_bd(operatie, functie, args, gata):
+    # functie(conexiune, *args) rulează pe firul bazei de date, apoi gata(rezultat) pe firul Tk
+    lucrari_bd.put((operatie, functie, args, gata))
+
+def fir_bd():
+    # rulează pe firul bazei de date, nu atinge widgeturile
+    conexiune = conecteaza()
+    conexiune.set_trace_callback(urmareste_instructiune)
+    while True:
+        try:
+            # salvările care așteaptă în grup se confirmă când nu vine nicio lucrare timp de GRUP_SALVARI_MS
+            operatie, functie, args, gata = lucrari_bd.get(timeout=GRUP_SALVARI_MS / 1000 if salvari_grup else None)
+        except queue.Empty:
+            salveaza_grupul()
+            continue
+        try:
+            with cronometreaza(operatie, "sql"):
+                if salvari_grup and functie not in (scrie_inregistrarea, confirma_grupul):
+                    # editările, ștergerile și rapoartele vin după salvările dinaintea lor
+                    confirma_grupul(conexiune)
+                rezultat = functie(conexiune, *args)
+            rezultate_bd.put((operatie, gata, rezultat, None))
+        except Exception as e:
+            rezultate_bd.put((operatie, gata, None, e))
+        lucrari_bd.task_done()
+
+def verifica_bd():
+    global operatie_formular
+    # o funcție care eșuează e raportată de Tk, rezultatele următoare se afișează în continuare
+    try:
+        while not rezultate_bd.empty():
+            operatie, gata, rezultat, eroare = rezultate_bd.get()
+            if operatie is operatie_formular:
+                operatie_formular = None
+                buton_salvare.config(state="normal")
+            try:
+                if eroare:
+                    operatie["eroare"] = str(eroare)
+                    status_label.config(text=f"❌ Eroare: {eroare}")
+                else:
+                    gata(rezultat)
+            finally:
+                termina_operatie(operatie)
+    finally:
+        app.after(20, verifica_bd)
+
+def la_derulare(first, last):
+    scroll_y.set(first, last)
+    #următoarea pagină se încarcă atunci când utilizatorul ajunge aproape de final
+    if float(last) > 0.9:
+        incarca_pagina()
+
+def sterge_randuri(conexiune, id_uri):
+    # întoarce numărul de rânduri șterse. puține trec prin triggerele pe rând, de la
+    # STERGERE_IN_BLOC munca lor se face o singură dată pentru toate, ca la import
+    randuri = [(id_sters,) for id_sters in id_uri]
+    if len(randuri) < STERGERE_IN_BLOC:
+        return conexiune.executemany("DELETE FROM registru WHERE id=?", randuri).rowcount
+    conexiune.execute("CREATE TEMP TABLE IF NOT EXISTS ids_sterse (id INTEGER PRIMARY KEY)")
+    conexiune.executemany("INSERT OR IGNORE INTO ids_sterse (id) VALUES (?)", randuri)
+    for nume, sql_creare, sql_lot in triggere_delete:
+        conexiune.execute(f"DROP TRIGGER {nume}")
+        conexiune.execute(sql_lot)
+    sterse = conexiune.execute("DELETE FROM registru WHERE id IN ids_sterse").rowcount
+    for nume, sql_creare, sql_lot in triggere_delete:
+        conexiune.execute(sql_creare)
+    conexiune.execute("DELETE FROM registru_sumar WHERE numar_acte = 0")
+    conexiune.execute("DELETE FROM ids_sterse")
+    return sterse
 
 def sterge():
     selected = tabel.selection()
     if not selected:
         messagebox.showwarning("Atenție", "Selectează o înregistrare de șters.")
         return
-    id_sters = tabel.item(selected[0])['values'][0]
-    cursor.execute("DELETE FROM registru WHERE id=?", (id_sters,))
-    conn.commit()
-    afiseaza()
-    status_label.config(text="✅ Șters cu succes!")
+    if len(selected) > 1 and not messagebox.askyesno("Ștergere", f"Ștergi cele {len(selected)} înregistrări selectate?"):
+        return
+    # elementele tabelului au ca nume id-ul înregistrării lor
+    id_uri = [int(element) for element in selected]
+    operatie = incepe_operatie("ștergere")
+    ruleaza_in_bd(operatie, sterge_inregistrarile, (id_uri,),
+                  lambda sterse: inregistrari_sterse(operatie, id_uri, sterse))
+
+def sterge_inregistrarile(conexiune, id_uri):
+    # toate înregistrările selectate într-o singură tranzacție, sau o singură cerere în modul client
+    if URL_SERVER:
+        return cerere_server("POST", "/records/delete", {"ids": id_uri})["deleted"]
+    return tranzactie_scriere(conexiune, sterge_randuri, id_uri)
+
+def inregistrari_sterse(operatie, id_uri, sterse):
+    global incarcate_vedere, total_vedere
+    #ștearsă de două ori printr-un dublu clic, a doua oară nu mai găsește rândul
+    elemente = [id_sters for id_sters in id_uri if tabel.exists(id_sters)]
+    if elemente:
+        with cronometreaza(operatie, "tabel"):
+            tabel.delete(*elemente)
+        incarcate_vedere -= len(elemente)
+        if total_vedere is not None:
+            total_vedere -= len(elemente)
+        arata_incarcate()
+    if id_editat in id_uri:
+        goleste_formular()
+    operatie["randuri"] = sterse
+    if len(id_uri) == 1:
+        status_label.config(text="✅ Șters cu succes!")
+    else:
+        status_label.config(text=f"✅ Au fost șterse {sterse} înregistrări!")
 
 def exporta_excel():
-    cursor.execute("SELECT * FROM registru")
-    rows = cursor.fetchall()
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Registru Notarial"
-    ws.append(coloane)
-    for row in rows:
-        ws.append(row)
-    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                            filetypes=[("Excel files", "*.xlsx")])
+    if fir_lucru and fir_lucru.is_alive():
+        return
+    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=TIPURI_EXPORT)
     if filepath:
-        wb.save(filepath)
-        messagebox.showinfo("Exportat", "Datele au fost exportate cu succes!")
-
-# Aplicație
-app = tk.Tk()
-app.title("Registru Notarial")
-app.geometry("1280x720")
-app.configure(bg="#2c2f33")
-
-# Font implicit
-font_base = ("Segoe UI", 17)
-font_bold = ("Segoe UI", 17, "bold")
-text_color = "#ffffff"
-
-# -------------- FORMULAR --------------
-frame_formular = tk.Frame(app, bg="#2c2f33")
-frame_formular.pack(padx=20, pady=20, anchor="nw")
-
-labels_text = [
-    "Nr. act", "Data", "Nume și prenume", "Data nașterii", "IDNP",
-    "Denumire act", "Taxă de stat", "Plata asistență", "Mențiuni"
-]
-entries = []
-
-contracte = [
-    "Contract de vânzare-cumpărare",
-    "Contract de donație",
-    "Contract de împrumut",
-    "Contract de închiriere",
-    "Procura",
-    "Testament",
-    "Certificat",
-    "Altele"
-]
+        porneste_lucru(exporta_in_fundal, filepath)
+
+def exporta_modificari():
+    if fir_lucru and fir_lucru.is_alive():
+        return
+    filepath = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=TIPURI_EXPORT)
+    if filepath:
+        porneste_lucru(exporta_in_fundal, filepath, True)
+
+def importa():
+    if fir_lucru and fir_lucru.is_alive():
+        return
+    filepath = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")])
+    if filepath:
+        porneste_lucru(importa_in_fundal, filepath)
+
+def porneste_lucru(functie, *args):
+    global fir_lucru
+    lucru_anulat.clear()
+    fir_lucru = threading.Thread(target=functie, args=args, daemon=True)
+    fir_lucru.start()
+    bara_progres.config(value=0)
+    bara_progres.pack(side="left", padx=10)
+    buton_anulare.pack(side="left", padx=10)
+    app.after(100, verifica_lucru)
+
+def exporta_in_fundal(filepath, doar_modificari=False):
+    # rulează în afara firului Tk: fără widgeturi aici, doar mesaje pentru verifica_lucru()
+    conn_export = conecteaza()
+    conn_export.set_trace_callback(urmareste_instructiune)
+    operatie = incepe_operatie("export modificări" if doar_modificari else "export")
+    fisier_text = None
+    # se scrie lângă fișier și se redenumește când e complet, un export anulat sau eșuat
+    # lasă neatins fișierul care era acolo înainte
+    fisier_partial = filepath + ".part"
+    # CSV și JSON Lines se scriu direct din fiecare lot, mult mai repede decât un registru Excel
+    comprimat = filepath.lower().endswith(".gz")
+    format_export = filepath.lower().removesuffix(".gz").rpartition(".")[2]
+    antet = coloane + ("Șters",) if doar_modificari else coloane
+    try:
+        if comprimat and format_export not in ("csv", "jsonl"):
+            raise ValueError("doar exporturile CSV și JSON Lines pot fi comprimate")
+        with cronometreaza(operatie, "sql"):
+            if doar_modificari:
+                if URL_SERVER:
+                    raise RuntimeError("modificările se exportă pe server, din baza lui de date")
+                # de la ultima modificare exportată până la cea mai nouă de acum,
+                # modificările de după rămân pentru exportul următor
+                ultimul, ultima_modificare = conn_export.execute(
+                    "SELECT nr_modificare, (SELECT ifnull(max(nr_modificare), 0) FROM registru_modificari) "
+                    "FROM registru_marcaj_export").fetchone()
+                total = conn_export.execute("SELECT count(*) FROM registru_modificari "
+                                            "WHERE nr_modificare > ? AND nr_modificare <= ?",
+                                            (ultimul, ultima_modificare)).fetchone()[0]
+            else:
+                ultimul = 0
+                # fiecare înregistrare e numărată o dată în registru_sumar
+                total = sum(rand[2] for rand in randuri_sumar(conn_export))
+        if format_export == "csv":
+            # utf-8-sig ca Excel să afișeze diacriticele, importul îl citește înapoi
+            fisier_text = deschide_fisier_export(fisier_partial, comprimat, "utf-8-sig")
+            writer = csv.writer(fisier_text)
+            writer.writerow(antet)
+        elif format_export == "jsonl":
+            # un obiect JSON pe linie, cu numele coloanelor drept chei
+            fisier_text = deschide_fisier_export(fisier_partial, comprimat, "utf-8")
+            codifica = json.JSONEncoder(ensure_ascii=False).encode
+        else:
+            # openpyxl se încarcă la primul export sau import, nu la pornire
+            import openpyxl
+            # registru write-only: rândurile se scriu direct pe disc, nu se țin în memorie
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Registru Notarial")
+            ws.append(antet)
+        # citiri scurte după id (după numărul de modificare la modificări), ca salvările din formular să nu fie blocate
+        gata = 0
+        while not lucru_anulat.is_set():
+            with cronometreaza(operatie, "sql"):
+                if doar_modificari:
+                    modificari = conn_export.execute(INTEROGARE_MODIFICARI,
+                                                     (ultimul, ultima_modificare, RANDURI_EXPORT)).fetchall()
+                    rows = [modificare[1:] for modificare in modificari]
+                else:
+                    rows = citeste_pagina(conn_export, FARA_CAUTARE, ultimul, RANDURI_EXPORT)
+            if not rows:
+                if not fisier_text:
+                    wb.save(fisier_partial)
+                else:
+                    fisier_text.close()
+                os.replace(fisier_partial, filepath)
+                if doar_modificari:
+                    # doar după ce fișierul e complet, un export eșuat se repetă pur și simplu
+                    tranzactie_scriere(conn_export, salveaza_marcaj_export, ultima_modificare)
+                operatie["randuri"] = gata
+                termina_operatie(operatie)
+                mesaje_lucru.put(("exportat",))
+                return
+            if format_export == "csv":
+                writer.writerows(rows)
+            elif format_export == "jsonl":
+                fisier_text.writelines(codifica(dict(zip(antet, row))) + "\n" for row in rows)
+            else:
+                for row in rows:
+                    ws.append(row)
+            ultimul = modificari[-1][0] if doar_modificari else rows[-1][0]
+            gata += len(rows)
+            total = max(total, gata)
+            mesaje_lucru.put(("progres", gata, total, f"📤 Se exportă... {gata} / {total}"))
+        if not fisier_text:
+            ws.close()
+        operatie["randuri"] = gata
+        operatie["eroare"] = "anulat"
+        termina_operatie(operatie)
+        mesaje_lucru.put(("oprit", "⛔ Export anulat"))
+    except Exception as e:
+        operatie["eroare"] = str(e)
+        termina_operatie(operatie)
+        mesaje_lucru.put(("eroare", e))
+    finally:
+        if fisier_text:
+            fisier_text.close()
+        conn_export.close()
+        if os.path.exists(fisier_partial):
+            os.remove(fisier_partial)
+
+def salveaza_marcaj_export(conexiune, nr_modificare):
+    conexiune.execute("UPDATE registru_marcaj_export SET nr_modificare = ?", (nr_modificare,))
 
-for i, text in enumerate(labels_text):
-    tk.Label(frame_formular, text=text, font=font_base, bg="#2c2f33", fg=text_color)\
-        .grid(row=i, column=0, sticky="w", pady=4)
+def deschide_fisier_export(filepath, comprimat, encoding):
+    # un fișier .gz se comprimă pe măsură ce se scrie, la nivelul obișnuit 6 al zlib:
+    # nivelul implicit 9 al gzip e de câteva ori mai lent pentru fișiere cu puțin mai mici
+    if comprimat:
+        return gzip.open(filepath, "wt", compresslevel=6, encoding=encoding, newline="")
+    return open(filepath, "w", encoding=encoding, newline="")
 
-    if text == "Denumire act":
-        combo = ttk.Combobox(frame_formular, values=contracte, font=font_base, width=57)
-        combo.grid(row=i, column=1, pady=4, padx=10)
-        combo.set("")  # implicit gol
-        entries.append(combo)
+def importa_in_fundal(filepath):
+    # rulează în afara firului Tk: fără widgeturi aici, doar mesaje pentru verifica_lucru()
+    conn_import = conecteaza()
+    try:
+        rows, total = citeste_fisier_import(filepath)
+        inregistrari = randuri_import(rows)
+        inceput = time.perf_counter()
+        gata = 0
+        while not lucru_anulat.is_set():
+            lot = list(itertools.islice(inregistrari, RANDURI_IMPORT))
+            if not lot:
+                viteza = gata / (time.perf_counter() - inceput)
+                mesaje_lucru.put(("importat", f"✅ Importate {gata} înregistrări ({viteza:.0f} rânduri/s)"))
+                return
+            # o tranzacție pe lot în loc de un commit pe fiecare înregistrare
+            if URL_SERVER:
+                cerere_server("POST", "/records", {"records": lot})
+            else:
+                tranzactie_scriere(conn_import, importa_lot, lot)
+            gata += len(lot)
+            viteza = gata / (time.perf_counter() - inceput)
+            mesaje_lucru.put(("progres", gata, total,
+                              f"📥 Se importă... {gata} / {total or '?'} ({viteza:.0f} rânduri/s)"))
+        mesaje_lucru.put(("importat", f"⛔ Import anulat după {gata} înregistrări"))
+    except Exception as e:
+        mesaje_lucru.put(("eroare", e))
+    finally:
+        conn_import.close()
+
+def importa_lot(conexiune, lot):
+    ultimul = conexiune.execute("SELECT ifnull(max(id), 0) FROM registru").fetchone()[0]
+    # triggerele pe rând își fac treaba o singură dată pentru tot lotul;
+    # celelalte conexiuni nu le văd niciodată lipsă
+    for nume, sql_creare, sql_lot in triggere_insert:
+        conexiune.execute(f"DROP TRIGGER {nume}")
+    conexiune.executemany('''
+        INSERT INTO registru (nr_act, data, nume_prenume, data_nasterii, idnp,
+                              denumire_act, taxa_stat, plata_asistenta, mentiuni)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', lot)
+    for nume, sql_creare, sql_lot in triggere_insert:
+        conexiune.execute(sql_lot, (ultimul,))
+        conexiune.execute(sql_creare)
+
+def citeste_fisier_import(filepath):
+    # întoarce rândurile ca flux și numărul lor, dacă se poate ști dinainte
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, "rb") as f:
+            total = max(sum(1 for linie in f) - 1, 0)
+        return citeste_csv(filepath), total
+    import openpyxl
+    wb = openpyxl.load_workbook(filepath, read_only=True)
+    ws = wb.worksheets[0]
+    total = max((ws.max_row or 1) - 1, 0)
+    return citeste_xlsx(wb, ws), total
+
+def citeste_csv(filepath):
+    with open(filepath, newline="", encoding="utf-8-sig") as f:
+        # Excel scrie ";" în loc de "," în multe setări regionale
+        dialect = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t")
+        f.seek(0)
+        for row in csv.reader(f, dialect):
+            yield tuple(row)
+
+def citeste_xlsx(wb, ws):
+    try:
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def randuri_import(rows):
+    # primul rând conține numele coloanelor. Fișierele scrise de exporta_excel()
+    # încep cu coloana ID, înregistrările importate primesc id-uri noi
+    antet = next(rows, None)
+    sari = 1 if antet and str(antet[0]).strip().upper() == "ID" else 0
+    for row in rows:
+        valori = tuple(valoare_import(valoare) for valoare in row[sari:sari + 9])
+        if any(valori):
+            yield valori + ("",) * (9 - len(valori))
+
+def valoare_import(valoare):
+    # celulele scrise în Excel pot fi numere sau date, registrul păstrează text
+    if valoare is None:
+        return ""
+    if isinstance(valoare, datetime.date):
+        return valoare.strftime("%d.%m.%Y")
+    if isinstance(valoare, float) and valoare.is_integer():
+        return str(int(valoare))
+    return str(valoare).strip()
+
+def verifica_lucru():
+    while not mesaje_lucru.empty():
+        mesaj = mesaje_lucru.get()
+        if mesaj[0] == "progres":
+            if mesaj[2]:
+                bara_progres.config(maximum=mesaj[2], value=mesaj[1])
+            else:
+                bara_progres.step(5)
+            status_label.config(text=mesaj[3])
+            continue
+        bara_progres.pack_forget()
+        buton_anulare.pack_forget()
+        if mesaj[0] == "exportat":
+            status_label.config(text="")
+            messagebox.showinfo("Exportat", "Datele au fost exportate cu succes!")
+        elif mesaj[0] == "importat":
+            status_label.config(text=mesaj[1])
+            cauta()
+        elif mesaj[0] == "oprit":
+            status_label.config(text=mesaj[1])
+        else:
+            status_label.config(text=f"❌ Eroare: {mesaj[1]}")
+        return
+    app.after(100, verifica_lucru)
+
+def anuleaza_lucru():
+    lucru_anulat.set()
+
+def arata_rapoarte():
+    global fereastra_rapoarte, tabel_rapoarte
+    if fereastra_rapoarte and fereastra_rapoarte.winfo_exists():
+        fereastra_rapoarte.lift()
     else:
-        entry = tk.Entry(frame_formular, width=60, font=font_base, bd=1, relief="solid",
-                         bg="#2c2f33", fg="white", insertbackground="white")
-        entry.grid(row=i, column=1, pady=4, padx=10)
-        entries.append(entry)
+        fereastra_rapoarte = tk.Toplevel(app)
+        fereastra_rapoarte.title("Rapoarte")
+        fereastra_rapoarte.geometry("1000x600")
+        fereastra_rapoarte.configure(bg="#2c2f33")
+        tk.Button(fereastra_rapoarte, text="🔄 Reîncarcă", command=arata_rapoarte,
+                  bg="#6c757d", fg="white", font=font_bold,
+                  relief="flat", padx=10, pady=3).pack(padx=20, pady=(20, 0), anchor="nw")
+        coloane_raport = ("Luna", "Denumire act", "Acte", "Taxă de stat", "Plata asistență")
+        tabel_rapoarte = ttk.Treeview(fereastra_rapoarte, columns=coloane_raport, show='headings')
+        for col in coloane_raport:
+            tabel_rapoarte.heading(col, text=col)
+            tabel_rapoarte.column(col, width=180, anchor="w")
+        tabel_rapoarte.pack(padx=20, pady=20, fill="both", expand=True)
 
-tk.Button(frame_formular, text="💾 Salvează", command=salveaza,
-          bg="#007BFF", fg="white", font=font_bold,
-          relief="flat", padx=15, pady=5).grid(row=len(labels_text), column=0, columnspan=2, pady=15)
+    # totalurile se citesc din registru_sumar, câteva rânduri pe lună
+    ruleaza_in_bd(incepe_operatie("rapoarte"), randuri_sumar, (), completeaza_rapoarte)
 
-status_label = tk.Label(frame_formular, text="", bg="#2c2f33", fg="lightgreen", font=font_base)
-status_label.grid(row=len(labels_text)+1, column=0, columnspan=2)
+def completeaza_rapoarte(randuri):
+    if not fereastra_rapoarte.winfo_exists():
+        return
+    tabel_rapoarte.delete(*tabel_rapoarte.get_children())
+    total_luna = None
+    for luna, denumire_act, numar_acte, taxa_stat, plata_asistenta in randuri:
+        if total_luna and total_luna[0] != luna:
+            adauga_total_raport(total_luna)
+            total_luna = None
+        if not total_luna:
+            total_luna = [luna, 0, 0, 0]
+        total_luna[1] += numar_acte
+        total_luna[2] += taxa_stat
+        total_luna[3] += plata_asistenta
+        tabel_rapoarte.insert('', 'end', values=(luna or "—", denumire_act or "—", numar_acte,
+                                                 format_bani(taxa_stat), format_bani(plata_asistenta)))
+    if total_luna:
+        adauga_total_raport(total_luna)
 
-# -------------- CĂUTARE --------------
-frame_cautare = tk.Frame(app, bg="#2c2f33")
-frame_cautare.pack(padx=20, anchor="nw")
+def adauga_total_raport(total_luna):
+    luna, numar_acte, taxa_stat, plata_asistenta = total_luna
+    tabel_rapoarte.insert('', 'end', values=(luna or "—", "Total", numar_acte,
+                                             format_bani(taxa_stat), format_bani(plata_asistenta)))
 
-tk.Label(frame_cautare, text="🔍 Caută:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
-entry_cautare = tk.Entry(frame_cautare, width=40, font=font_base, bd=1, relief="solid",
-                         bg="#444", fg="white", insertbackground="white")
-entry_cautare.pack(side="left", padx=10)
+def format_bani(suma):
+    return f"{suma // 100}.{suma % 100:02}"
 
-tk.Button(frame_cautare, text="Caută", command=cauta,
-          bg="#28a745", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+def arata_diagnostic():
+    global fereastra_diagnostic, tabel_diagnostic, eticheta_cache
+    if fereastra_diagnostic and fereastra_diagnostic.winfo_exists():
+        fereastra_diagnostic.lift()
+        return
+    fereastra_diagnostic = tk.Toplevel(app)
+    fereastra_diagnostic.title("Diagnostic")
+    fereastra_diagnostic.geometry("1200x600")
+    fereastra_diagnostic.configure(bg="#2c2f33")
+    tk.Label(fereastra_diagnostic, text=f"Operațiile mai lente de {PRAG_LENT_MS} ms se scriu în {FISIER_JURNAL_LENT}",
+             font=font_base, bg="#2c2f33", fg=text_color).pack(padx=20, pady=(20, 0), anchor="nw")
+    eticheta_cache = tk.Label(fereastra_diagnostic, font=font_base, bg="#2c2f33", fg=text_color)
+    eticheta_cache.pack(padx=20, pady=(10, 0), anchor="nw")
+    coloane_diagnostic = ("Ora", "Operație", "Total ms", "SQL ms", "Tabel ms", "Rânduri", "Instrucțiuni")
+    tabel_diagnostic = ttk.Treeview(fereastra_diagnostic, columns=coloane_diagnostic, show='headings')
+    for col in coloane_diagnostic:
+        tabel_diagnostic.heading(col, text=col)
+        tabel_diagnostic.column(col, width=150, anchor="w")
+    tabel_diagnostic.tag_configure("lent", foreground="#ff6b6b")
+    tabel_diagnostic.pack(padx=20, pady=20, fill="both", expand=True)
+    completeaza_diagnostic()
 
-tk.Button(frame_cautare, text="🗑️ Șterge", command=sterge,
-          bg="#dc3545", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+def completeaza_diagnostic():
+    # se reîmprospătează în fiecare secundă cât timp fereastra e deschisă
+    if not fereastra_diagnostic.winfo_exists():
+        return
+    eticheta_cache.config(text=f"Cache căutări: {cautari_memorate_gasite} găsite, {cautari_memorate_ratate} ratate, "
+                               f"{randuri_memorate} din {RANDURI_CACHE_CAUTARE} rânduri")
+    tabel_diagnostic.delete(*tabel_diagnostic.get_children())
+    for operatie in list(operatii_recente):
+        tabel_diagnostic.insert('', 'end', values=(
+            operatie["la"].strftime("%H:%M:%S"), operatie["nume"], f"{operatie['durata'] * 1000:.1f}",
+            f"{operatie['sql'] * 1000:.1f}", f"{operatie['tabel'] * 1000:.1f}", operatie["randuri"],
+            operatie["instructiuni"]), tags=("lent",) if operatie["durata"] * 1000 >= PRAG_LENT_MS else ())
+    fereastra_diagnostic.after(1000, completeaza_diagnostic)
 
-tk.Button(frame_cautare, text="📤 Exportă", command=exporta_excel,
-          bg="#17a2b8", fg="white", font=font_bold,
-          relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+def randuri_sumar(conexiune):
+    # actele și totalurile taxelor pe lună și denumire act, luna cea mai nouă întâi
+    if URL_SERVER:
+        return cerere_server("GET", "/stats")["rows"]
+    return conexiune.execute('''
+        SELECT luna, denumire_act, numar_acte, taxa_stat_bani, plata_asistenta_bani
+        FROM registru_sumar ORDER BY luna DESC, denumire_act
+    ''').fetchall()
 
-# -------------- TABEL CU SCROLL --------------
-frame_tabel = tk.Frame(app, bg="#2c2f33")
-frame_tabel.pack(padx=20, pady=20, fill="both", expand=True)
+async def ruleaza_server(host, port, cititori):
+    global conexiuni_citire_server, executor_citire_server, scrieri_server, executor_scriere_server
+    global conn_scriere_server
+    conexiuni_citire_server = asyncio.Queue()
+    for _ in range(cititori):
+        conexiuni_citire_server.put_nowait(conecteaza(check_same_thread=False))
+    executor_citire_server = concurrent.futures.ThreadPoolExecutor(cititori)
+    scrieri_server = asyncio.Queue(COADA_SCRIERI)
+    executor_scriere_server = concurrent.futures.ThreadPoolExecutor(1)
+    conn_scriere_server = conecteaza(check_same_thread=False)
+    # ținută într-o variabilă, bucla de evenimente păstrează sarcinile doar prin referințe slabe
+    sarcina_scriitor = asyncio.create_task(scriitor_server())
+    server = await asyncio.start_server(trateaza_client, host, port)
+    async with server:
+        await server.serve_forever()
 
-coloane = (
-    "ID", "Nr. act", "Data", "Nume și prenume", "Data nașterii", "IDNP",
-    "Denumire act", "Taxă de stat", "Plata asistență", "Mențiuni"
-)
+async def citire_server(functie, *args):
+    # așteaptă o conexiune liberă din grup, interogarea rulează pe un fir al grupului
+    conexiune = await conexiuni_citire_server.get()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor_citire_server, functie, conexiune, *args)
+    finally:
+        conexiuni_citire_server.put_nowait(conexiune)
+
+async def scriere_server(functie, *args):
+    # pusă în coadă pentru scriitor_server(), așteaptă cât timp coada e plină
+    rezultat = asyncio.get_running_loop().create_future()
+    await scrieri_server.put((functie, args, rezultat))
+    return await rezultat
+
+async def scriitor_server():
+    bucla = asyncio.get_running_loop()
+    while True:
+        scrieri = [await scrieri_server.get()]
+        while len(scrieri) < GRUP_SCRIERI and not scrieri_server.empty():
+            scrieri.append(scrieri_server.get_nowait())
+        try:
+            rezultate = await bucla.run_in_executor(executor_scriere_server, tranzactie_scriere, conn_scriere_server,
+                                                    ruleaza_scrieri, [(functie, args) for functie, args, rezultat in scrieri])
+        except Exception as e:
+            rezultate = [e] * len(scrieri)
+        for (functie, args, rezultat), valoare in zip(scrieri, rezultate):
+            if isinstance(valoare, Exception):
+                rezultat.set_exception(valoare)
+            else:
+                rezultat.set_result(valoare)
+
+def ruleaza_scrieri(conexiune, scrieri):
+    # fiecare scriere are savepoint-ul ei, una care eșuează se anulează fără celelalte
+    rezultate = []
+    for functie, args in scrieri:
+        conexiune.execute("SAVEPOINT scriere")
+        try:
+            rezultate.append(functie(conexiune, *args))
+        except sqlite3.Error as e:
+            conexiune.execute("ROLLBACK TO scriere")
+            rezultate.append(e)
+        conexiune.execute("RELEASE scriere")
+    return rezultate
 
-scroll_y = tk.Scrollbar(frame_tabel, orient="vertical")
-scroll_y.pack(side="right", fill="y")
-
-tabel = ttk.Treeview(frame_tabel, columns=coloane, show='headings', yscrollcommand=scroll_y.set)
-
-style = ttk.Style()
-style.theme_use("default")
-style.configure("Treeview",
-                background="#444",
-                foreground="white",
-                rowheight=25,
-                fieldbackground="#444",
-                font=font_base)
-style.configure("Treeview.Heading",
-                background="#343a40",
-                foreground="white",
-                font=font_bold)
-
-for col in coloane:
-    tabel.heading(col, text=col)
-    tabel.column(col, width=150, anchor="w")
-
-tabel.pack(fill="both", expand=True)
-scroll_y.config(command=tabel.yview)
-
-afiseaza()
-app.mainloop()
\ No newline at end of file
+def insereaza_inregistrari(conexiune, inregistrari):
+    # o înregistrare se salvează ca din formular, mai multe ca la import
+    if len(inregistrari) == 1:
+        return [insereaza(conexiune, inregistrari[0])]
+    ultimul = conexiune.execute("SELECT ifnull(max(id), 0) FROM registru").fetchone()[0]
+    importa_lot(conexiune, inregistrari)
+    return [rand[0] for rand in conexiune.execute("SELECT id FROM registru WHERE id > ? ORDER BY id", (ultimul,))]
+
+async def trateaza_client(reader, writer):
+    # HTTP/1.1, cererile de pe o conexiune primesc răspuns pe rând până se închide
+    try:
+        while True:
+            linie_cerere = await reader.readline()
+            if not linie_cerere.strip():
+                break
+            metoda, tinta, versiune = linie_cerere.decode("latin-1").split()
+            antete = {}
+            while True:
+                linie = await reader.readline()
+                if not linie.strip():
+                    break
+                nume, _, valoare = linie.decode("latin-1").partition(":")
+                antete[nume.strip().lower()] = valoare.strip()
+            corp = await reader.readexactly(int(antete.get("content-length", 0)))
+            pastreaza = versiune == "HTTP/1.1" and antete.get("connection", "").lower() != "close"
+            await trateaza_cerere(writer, metoda, tinta, antete, corp, pastreaza)
+            if not pastreaza:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def trateaza_cerere(writer, metoda, tinta, antete, corp, pastreaza):
+    url = urllib.parse.urlsplit(tinta)
+    interogare = dict(urllib.parse.parse_qsl(url.query))
+    cale_inregistrare = re.fullmatch(r"/records/(\d+)", url.path)
+    if TOKEN_SERVER and not hmac.compare_digest(antete.get("authorization", "").encode(),
+                                                f"Bearer {TOKEN_SERVER}".encode()):
+        return await trimite_json(writer, 401, {"error": "token greșit sau lipsă"}, pastreaza)
+    try:
+        if metoda == "GET" and url.path == "/records":
+            # pagini de cel mult RANDURI_EXPORT rânduri, un rezultat mare se citește pagină cu pagină
+            limita = min(max(int(interogare.get("limit", RANDURI_PAGINA)), 1), RANDURI_EXPORT)
+            rows = await citire_server(citeste_pagina, cautare_cerere(interogare),
+                                       id_cerere(interogare.get("last_id", 0)), limita)
+            return await trimite_json(writer, 200, {"rows": rows}, pastreaza)
+        if metoda == "GET" and url.path == "/count":
+            numar = await citire_server(numara_inregistrari, cautare_cerere(interogare))
+            return await trimite_json(writer, 200, {"count": numar}, pastreaza)
+        if metoda == "POST" and url.path == "/records":
+            inregistrari = [inregistrare_cerere(inregistrare) for inregistrare in json.loads(corp)["records"]]
+            if not inregistrari:
+                raise ValueError("nicio înregistrare")
+            id_uri = await scriere_server(insereaza_inregistrari, inregistrari)
+            return await trimite_json(writer, 200, {"ids": id_uri}, pastreaza)
+        if metoda == "PUT" and cale_inregistrare:
+            inregistrare = inregistrare_cerere(json.loads(corp)["record"])
+            actualizate = await scriere_server(actualizeaza_rand, id_cerere(cale_inregistrare.group(1)), inregistrare)
+            return await trimite_json(writer, 200, {"updated": actualizate}, pastreaza)
+        if metoda == "DELETE" and cale_inregistrare:
+            if not await scriere_server(sterge_randuri, [id_cerere(cale_inregistrare.group(1))]):
+                return await trimite_json(writer, 404, {"error": f"nu există înregistrarea {cale_inregistrare.group(1)}"},
+                                          pastreaza)
+            return await trimite_json(writer, 200, {"deleted": 1}, pastreaza)
+        if metoda == "POST" and url.path == "/records/delete":
+            id_uri = [id_cerere(id_sters) for id_sters in json.loads(corp)["ids"]]
+            return await trimite_json(writer, 200, {"deleted": await scriere_server(sterge_randuri, id_uri)}, pastreaza)
+        if metoda == "GET" and url.path == "/stats":
+            return await trimite_json(writer, 200, {"rows": await citire_server(randuri_sumar)}, pastreaza)
+        if metoda == "GET" and url.path == "/export":
+            return await trimite_export(writer, pastreaza)
+        return await trimite_json(writer, 404, {"error": f"nu există {metoda} {url.path}"}, pastreaza)
+    except (ValueError, KeyError, TypeError, OverflowError) as e:
+        return await trimite_json(writer, 400, {"error": str(e)}, pastreaza)
+    except sqlite3.Error as e:
+        return await trimite_json(writer, 500, {"error": str(e)}, pastreaza)
+
+def inregistrare_cerere(valori):
+    # cele 9 valori ale unei înregistrări trimise de client, text sau numere, null pentru un câmp gol
+    if not isinstance(valori, list) or len(valori) != 9:
+        raise ValueError("o înregistrare e o listă de 9 valori")
+    if any(isinstance(valoare, bool) or not isinstance(valoare, (str, int, float, type(None))) for valoare in valori):
+        raise ValueError("valorile unei înregistrări sunt text, numere sau null")
+    return tuple("" if valoare is None else str(valoare) for valoare in valori)
+
+def id_cerere(valoare):
+    # un id de înregistrare sau last_id trimis de client, întregii SQLite au 64 de biți
+    if isinstance(valoare, bool):
+        raise ValueError(f"{valoare} nu e un id de înregistrare")
+    id_inregistrare = int(valoare)
+    if not 0 <= id_inregistrare < 2**63:
+        raise ValueError(f"{valoare} nu e un id de înregistrare")
+    return id_inregistrare
+
+def cautare_cerere(interogare):
+    # căutarea unei cereri /records sau /count, date ISO
+    return (interogare.get("query", "").strip(), data_iso(interogare.get("date_from", "")),
+            data_iso(interogare.get("date_to", "")), interogare.get("act_type", "").strip())
+
+async def trimite_json(writer, stare, date, pastreaza):
+    corp = json.dumps(date, ensure_ascii=False).encode()
+    writer.write(antet_raspuns(stare, "application/json", pastreaza, f"Content-Length: {len(corp)}") + corp)
+    await writer.drain()
+
+async def trimite_export(writer, pastreaza):
+    # CSV ca la butonul de export, fiecare lot se trimite imediat ce e citit
+    writer.write(antet_raspuns(200, "text/csv; charset=utf-8", pastreaza, "Transfer-Encoding: chunked"))
+    text = io.StringIO()
+    text.write("\ufeff")
+    csv.writer(text).writerow(coloane)
+    ultimul = 0
+    while True:
+        rows = await citire_server(citeste_pagina, FARA_CAUTARE, ultimul, RANDURI_EXPORT)
+        csv.writer(text).writerows(rows)
+        bucata = text.getvalue().encode()
+        text.seek(0)
+        text.truncate()
+        if bucata:
+            writer.write(f"{len(bucata):X}\r\n".encode() + bucata + b"\r\n")
+            await writer.drain()
+        if len(rows) < RANDURI_EXPORT:
+            break
+        ultimul = rows[-1][0]
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+def antet_raspuns(stare, tip_continut, pastreaza, antet_lungime):
+    return (f"HTTP/1.1 {stare} {MOTIVE_HTTP[stare]}\r\n"
+            f"Content-Type: {tip_continut}\r\n"
+            f"{antet_lungime}\r\n"
+            f"Connection: {'keep-alive' if pastreaza else 'close'}\r\n\r\n").encode()
+
+def ruleaza_comanda():
+    # comenzile din linia de comandă, rulate fără fereastră; întoarce codul de ieșire
+    # ieșirea redirecționată e UTF-8 indiferent de pagina de cod a consolei
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+    if URL_SERVER and argumente.comanda in ("serve", "vacuum"):
+        parser_argumente.error(f"{argumente.comanda} rulează pe baza de date a serverului, fără --server")
+    if argumente.comanda == "search":
+        try:
+            cautare = (argumente.valoare.strip(), data_iso(argumente.data_de_la), data_iso(argumente.data_pana_la),
+                       argumente.tip_act.strip())
+        except ValueError as e:
+            parser_argumente.error(str(e))
+        writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+        writer.writerow(coloane)
+        # aceleași pagini ca în tabel, citite una după alta
+        ultimul = 0
+        afisate = 0
+        while argumente.limit is None or afisate < argumente.limit:
+            limita = RANDURI_PAGINA if argumente.limit is None else min(RANDURI_PAGINA, argumente.limit - afisate)
+            try:
+                rows = citeste_pagina(conn, cautare, ultimul, limita)
+            except (RuntimeError, OSError) as e:
+                print(f"❌ Eroare: {e}", file=sys.stderr)
+                return 1
+            writer.writerows(rows)
+            afisate += len(rows)
+            if len(rows) < limita:
+                break
+            ultimul = rows[-1][0]
+        return 0
+
+    if argumente.comanda in ("export", "import"):
+        if argumente.comanda == "export":
+            functie, argumente_fir = exporta_in_fundal, (argumente.fisier, argumente.modificari)
+        else:
+            functie, argumente_fir = importa_in_fundal, (argumente.fisier,)
+        # același fir de lucru ca butoanele, progresul merge la stderr
+        fir = threading.Thread(target=functie, args=argumente_fir, daemon=True)
+        fir.start()
+        while True:
+            try:
+                mesaj = mesaje_lucru.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                lucru_anulat.set()
+                continue
+            if mesaj[0] == "progres":
+                print(f"\r{mesaj[3]}", end="", file=sys.stderr, flush=True)
+                continue
+            print(file=sys.stderr)
+            if mesaj[0] == "exportat":
+                print(f"✅ Exportat în {argumente.fisier}", file=sys.stderr)
+                return 0
+            if mesaj[0] in ("importat", "oprit"):
+                print(mesaj[1], file=sys.stderr)
+                return 0 if mesaj[1].startswith("✅") else 1
+            print(f"❌ Eroare: {mesaj[1]}", file=sys.stderr)
+            return 1
+
+    if argumente.comanda == "stats":
+        # citite din registru_sumar, ca în fereastra de rapoarte
+        try:
+            rows = randuri_sumar(conn)
+        except (RuntimeError, OSError) as e:
+            print(f"❌ Eroare: {e}", file=sys.stderr)
+            return 1
+        luni = {}
+        for luna, denumire_act, numar_acte, taxa_stat, plata_asistenta in rows:
+            total_luna = luni.setdefault(luna, [0, 0, 0])
+            total_luna[0] += numar_acte
+            total_luna[1] += taxa_stat
+            total_luna[2] += plata_asistenta
+        print("\t".join(("Luna", "Acte", "Taxă de stat", "Plata asistență")))
+        toate_actele = toata_taxa_stat = toata_plata_asistenta = 0
+        for luna, (numar_acte, taxa_stat, plata_asistenta) in sorted(luni.items()):
+            print("\t".join((luna or "—", str(numar_acte), format_bani(taxa_stat), format_bani(plata_asistenta))))
+            toate_actele += numar_acte
+            toata_taxa_stat += taxa_stat
+            toata_plata_asistenta += plata_asistenta
+        print("\t".join(("Total", str(toate_actele), format_bani(toata_taxa_stat), format_bani(toata_plata_asistenta))))
+        return 0
+
+    if argumente.comanda == "vacuum":
+        marime = os.path.getsize(BAZA_DATE)
+        if fts_activ:
+            conn.execute("INSERT INTO registru_fts (registru_fts) VALUES ('optimize')")
+            conn.commit()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        print(f"{BAZA_DATE}: {marime // 1024} KB -> {os.path.getsize(BAZA_DATE) // 1024} KB", file=sys.stderr)
+        return 0
+
+    if argumente.comanda == "serve":
+        print(f"Se servește {BAZA_DATE} pe http://{argumente.host}:{argumente.port}", file=sys.stderr)
+        try:
+            asyncio.run(ruleaza_server(argumente.host, argumente.port, argumente.cititori))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+if __name__ == "__main__":
+    if argumente.comanda:
+        sys.exit(ruleaza_comanda())
+
+    # Aplicație
+    app = tk.Tk()
+    app.title("Registru Notarial")
+    app.geometry("1280x720")
+    app.configure(bg="#2c2f33")
+
+    # Font implicit
+    font_base = ("Segoe UI", 17)
+    font_bold = ("Segoe UI", 17, "bold")
+    text_color = "#ffffff"
+
+    # -------------- FORMULAR --------------
+    frame_formular = tk.Frame(app, bg="#2c2f33")
+    frame_formular.pack(padx=20, pady=20, anchor="nw")
+
+    labels_text = [
+        "Nr. act", "Data", "Nume și prenume", "Data nașterii", "IDNP",
+        "Denumire act", "Taxă de stat", "Plata asistență", "Mențiuni"
+    ]
+    entries = []
+
+    contracte = [
+        "Contract de vânzare-cumpărare",
+        "Contract de donație",
+        "Contract de împrumut",
+        "Contract de închiriere",
+        "Procura",
+        "Testament",
+        "Certificat",
+        "Altele"
+    ]
+
+    for i, text in enumerate(labels_text):
+        tk.Label(frame_formular, text=text, font=font_base, bg="#2c2f33", fg=text_color)\
+            .grid(row=i, column=0, sticky="w", pady=4)
+
+        if text == "Denumire act":
+            combo = ttk.Combobox(frame_formular, values=contracte, font=font_base, width=57)
+            combo.grid(row=i, column=1, pady=4, padx=10)
+            combo.set("")  # implicit gol
+            entries.append(combo)
+        else:
+            entry = tk.Entry(frame_formular, width=60, font=font_base, bd=1, relief="solid",
+                             bg="#2c2f33", fg="white", insertbackground="white")
+            entry.grid(row=i, column=1, pady=4, padx=10)
+            entries.append(entry)
+
+    buton_salvare = tk.Button(frame_formular, text="💾 Salvează", command=salveaza,
+                              bg="#007BFF", fg="white", font=font_bold,
+                              relief="flat", padx=15, pady=5)
+    buton_salvare.grid(row=len(labels_text), column=0, columnspan=2, pady=15)
+
+    status_label = tk.Label(frame_formular, text="", bg="#2c2f33", fg="lightgreen", font=font_base)
+    status_label.grid(row=len(labels_text)+1, column=0, columnspan=2)
+
+    # -------------- CĂUTARE --------------
+    frame_cautare = tk.Frame(app, bg="#2c2f33")
+    frame_cautare.pack(padx=20, anchor="nw")
+
+    tk.Label(frame_cautare, text="🔍 Caută:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    text_cautare = tk.StringVar()
+    text_cautare.trace_add("write", la_tastare)
+    entry_cautare = tk.Entry(frame_cautare, width=40, font=font_base, bd=1, relief="solid",
+                             bg="#444", fg="white", insertbackground="white", textvariable=text_cautare)
+    entry_cautare.pack(side="left", padx=10)
+
+    tk.Button(frame_cautare, text="Caută", command=cauta,
+              bg="#28a745", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_cautare, text="🔄 Reîncarcă", command=reincarca,
+              bg="#6c757d", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_cautare, text="🗑️ Șterge", command=sterge,
+              bg="#dc3545", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_cautare, text="✏️ Editează", command=editeaza,
+              bg="#ffc107", fg="black", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_cautare, text="📤 Exportă", command=exporta_excel,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    # -------------- UNELTE --------------
+    frame_unelte = tk.Frame(app, bg="#2c2f33")
+    frame_unelte.pack(padx=20, pady=(10, 0), anchor="nw")
+
+    tk.Button(frame_unelte, text="📤 Exportă modificările", command=exporta_modificari,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_unelte, text="📥 Importă", command=importa,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_unelte, text="📊 Rapoarte", command=arata_rapoarte,
+              bg="#17a2b8", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    tk.Button(frame_unelte, text="⏱ Diagnostic", command=arata_diagnostic,
+              bg="#6c757d", fg="white", font=font_bold,
+              relief="flat", padx=10, pady=3).pack(side="left", padx=10)
+
+    # vizibile doar cât timp rulează un export sau un import
+    bara_progres = ttk.Progressbar(frame_unelte, length=200, mode="determinate")
+    buton_anulare = tk.Button(frame_unelte, text="✖ Anulează", command=anuleaza_lucru,
+                              bg="#6c757d", fg="white", font=font_bold,
+                              relief="flat", padx=10, pady=3)
+
+    # -------------- FILTRE --------------
+    frame_filtre = tk.Frame(app, bg="#2c2f33")
+    frame_filtre.pack(padx=20, pady=(10, 0), anchor="nw")
+
+    # filtrele restrâng căutarea la fel ca tastarea
+    tk.Label(frame_filtre, text="📅 De la:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    text_data_de_la = tk.StringVar()
+    text_data_de_la.trace_add("write", la_tastare)
+    entry_data_de_la = tk.Entry(frame_filtre, width=12, font=font_base, bd=1, relief="solid",
+                                bg="#444", fg="white", insertbackground="white", textvariable=text_data_de_la)
+    entry_data_de_la.pack(side="left", padx=10)
+
+    tk.Label(frame_filtre, text="Până la:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    text_data_pana_la = tk.StringVar()
+    text_data_pana_la.trace_add("write", la_tastare)
+    entry_data_pana_la = tk.Entry(frame_filtre, width=12, font=font_base, bd=1, relief="solid",
+                                  bg="#444", fg="white", insertbackground="white", textvariable=text_data_pana_la)
+    entry_data_pana_la.pack(side="left", padx=10)
+
+    tk.Label(frame_filtre, text="Denumire act:", font=font_base, bg="#2c2f33", fg=text_color).pack(side="left")
+    text_tip_act = tk.StringVar()
+    text_tip_act.trace_add("write", la_tastare)
+    filtru_tip_act = ttk.Combobox(frame_filtre, values=["", *contracte], font=font_base, width=20,
+                                  textvariable=text_tip_act)
+    filtru_tip_act.pack(side="left", padx=10)
+
+    eticheta_incarcate = tk.Label(frame_filtre, text="", font=font_base, bg="#2c2f33", fg=text_color)
+    eticheta_incarcate.pack(side="left", padx=20)
+
+    # -------------- TABEL CU SCROLL --------------
+    frame_tabel = tk.Frame(app, bg="#2c2f33")
+    frame_tabel.pack(padx=20, pady=20, fill="both", expand=True)
+
+    scroll_y = tk.Scrollbar(frame_tabel, orient="vertical")
+    scroll_y.pack(side="right", fill="y")
+
+    tabel = ttk.Treeview(frame_tabel, columns=coloane, show='headings', yscrollcommand=la_derulare)
+
+    style = ttk.Style()
+    style.theme_use("default")
+    style.configure("Treeview",
+                    background="#444",
+                    foreground="white",
+                    rowheight=25,
+                    fieldbackground="#444",
+                    font=font_base)
+    style.configure("Treeview.Heading",
+                    background="#343a40",
+                    foreground="white",
+                    font=font_bold)
+
+    for col in coloane:
+        tabel.heading(col, text=col)
+        tabel.column(col, width=150, anchor="w")
+
+    tabel.pack(fill="both", expand=True)
+    scroll_y.config(command=tabel.yview)
+    tabel.bind("<Double-1>", lambda event: editeaza())
+    app.bind("<Escape>", lambda event: anuleaza_editarea())
+
+    threading.Thread(target=fir_citire, daemon=True).start()
+    app.after(20, verifica_citiri)
+    threading.Thread(target=fir_bd, daemon=True).start()
+    app.after(20, verifica_bd)
+    # fereastra se desenează înainte să se citească vreun rând
+    app.update()
+    if TIMP_PORNIRE:
+        print("window", flush=True)
+    afiseaza()
+    app.mainloop()
+    # salvările rămase în coadă la închiderea ferestrei se scriu înainte de ieșire
+    if GRUP_SALVARI:
+        salveaza_grupul()
+    lucrari_bd.join()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import argparse
+import os
+import pathlib
+import random
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+from registry_benchmark import SCRIPT, load_registry, close_registry, generate, export
+
+# Compares the old Excel export (every row read at once into a normal workbook)
+# with the script's own export_worker (rows read in batches and streamed into a
+# write-only workbook) on a generated registry.
+
+
+def export_before(registry, filepath):
+    rows = registry["read_page"](registry["read_conn"], registry["NO_SEARCH"], 0, -1)
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.title = "Notarial Registry"
+    worksheet.append(registry["columns"])
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(filepath)
+
+
+def measure(export_function, registry, out_path, rows):
+    start = time.perf_counter()
+    export_function(registry, out_path)
+    seconds = time.perf_counter() - start
+
+    # Second run for memory, tracemalloc slows the export down
+    tracemalloc.start()
+    export_function(registry, out_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows / seconds, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel export benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--script", default=str(SCRIPT), help="registry script to measure")
+    args = parser.parse_args()
+
+    script = pathlib.Path(args.script).resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        registry = load_registry(script, folder)
+        generate(registry, args.rows, random.Random(1))
+        out_path = os.path.join(folder, "export.xlsx")
+        print(f"{args.rows} rows")
+        print(f"{'':8}{'rows/sec':>12}{'peak MB':>12}")
+        for label, export_function in (("before", export_before), ("after", export)):
+            speed, peak = measure(export_function, registry, out_path, args.rows)
+            print(f"{label:8}{speed:12.0f}{peak:12.1f}")
+        close_registry(registry)
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
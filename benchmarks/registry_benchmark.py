@@ -0,0 +1,274 @@
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Times the database work behind save, search, display, delete and export on
+# generated registries of several sizes and writes the results as JSON.
+#
+# The code measured is the script itself: settings, schema, migrations and
+# functions are run, the window is not built outside __main__. Works with the
+# English and Russian scripts, which share one schema, and with the Romanian
+# one through ROMANIAN_NAMES.
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "1920x1080 (FOR PCs)" / "NotaryRegisterEN.py"
+
+act_types = [
+    "Sales Contract", "Donation Contract", "Loan Contract", "Lease Contract",
+    "Power of Attorney", "Will", "Certificate", "Other"
+]
+
+first_names = ["Ion", "Maria", "Ștefan", "Elena", "Gheorghe", "Ana", "Vasile", "Cristina",
+               "Андрей", "Ольга", "Сергей", "Наталья", "Дмитрий", "Татьяна"]
+last_names = ["Popescu", "Rusu", "Țurcanu", "Ceban", "Lungu", "Munteanu", "Ciobanu", "Roșca",
+              "Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Волкова"]
+
+# Rows written per transaction while generating a registry
+GENERATE_BATCH = 50000
+
+# Records selected for the timed bulk delete, at most
+BULK_DELETE = 10000
+
+# Export file formats timed, by file extension
+EXPORT_FORMATS = ("xlsx", "csv", "jsonl", "csv.gz", "jsonl.gz")
+
+# The benchmark's own queries, for the English and Russian schema
+QUERIES = {
+    "sample": "SELECT personal_id, act_number, full_name FROM registry WHERE id = ?",
+    "last_id": "SELECT max(id) FROM registry",
+}
+
+# The Romanian script's names for what the benchmark uses, and its schema
+ROMANIAN_NAMES = {
+    "write_transaction": "tranzactie_scriere",
+    "read_conn": "conn_citire",
+    "import_batch": "importa_lot",
+    "insert_record": "insereaza",
+    "search_condition": "conditie_cautare",
+    "page_query": "interogare_pagina",
+    "PAGE_SIZE": "RANDURI_PAGINA",
+    "delete_rows": "sterge_randuri",
+    "export_worker": "exporta_in_fundal",
+    "task_messages": "mesaje_lucru",
+    "slow_log": "jurnal_lent",
+    "read_page": "citeste_pagina",
+    "NO_SEARCH": "FARA_CAUTARE",
+    "columns": "coloane",
+}
+ROMANIAN_QUERIES = {
+    "sample": "SELECT idnp, nr_act, nume_prenume FROM registru WHERE id = ?",
+    "last_id": "SELECT max(id) FROM registru",
+}
+
+
+def load_registry(script, folder):
+    # The database files are created in folder, which stays the working directory
+    source = pathlib.Path(script).read_text(encoding="utf-8")
+    os.chdir(folder)
+    # No command on the command line, the script's own parser sees no arguments
+    sys.argv = [str(script)]
+    registry = {"__name__": "registry"}
+    exec(compile(source, str(script), "exec"), registry)
+    if "tranzactie_scriere" in registry:
+        registry.update({name: registry[romanian] for name, romanian in ROMANIAN_NAMES.items()})
+        registry["queries"] = ROMANIAN_QUERIES
+    else:
+        registry["queries"] = QUERIES
+    return registry
+
+
+def close_registry(registry):
+    # The next load_registry() opens its own connections and slow log in its folder
+    registry["conn"].close()
+    registry["read_conn"].close()
+    for handler in registry["slow_log"].handlers[:]:
+        registry["slow_log"].removeHandler(handler)
+        handler.close()
+
+
+def random_record(rnd, number):
+    date = datetime.date(2015, 1, 1) + datetime.timedelta(days=rnd.randrange(3650))
+    birth_date = datetime.date(1940, 1, 1) + datetime.timedelta(days=rnd.randrange(23000))
+    return (
+        f"{number}/{date.year}",
+        date.strftime("%d.%m.%Y"),
+        f"{rnd.choice(first_names)} {rnd.choice(last_names)}",
+        birth_date.strftime("%d.%m.%Y"),
+        f"{rnd.choice((2, 0)) * 10**12 + rnd.randrange(10**12):013d}",
+        rnd.choice(act_types),
+        str(rnd.choice((50, 100, 150, 200, 350, 500))),
+        f"{rnd.randint(0, 300)},{rnd.choice(('00', '50'))}",
+        rnd.choice(("", "", "", "copie", "дубликат")),
+    )
+
+
+def generate(registry, rows, rnd):
+    done = 0
+    while done < rows:
+        batch = [random_record(rnd, done + i + 1) for i in range(min(GENERATE_BATCH, rows - done))]
+        registry["write_transaction"](registry["conn"], registry["import_batch"], batch)
+        done += len(batch)
+
+
+def timings(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 3),
+    }
+
+
+def timed(work, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        work()
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+
+def first_page(registry, condition, params):
+    # What the table shows first after a search or a refresh
+    return registry["conn"].execute(registry["page_query"](condition),
+                                    {**params, "last_id": 0, "limit": registry["PAGE_SIZE"]}).fetchall()
+
+
+def export(registry, filepath, changes_only=False):
+    start = time.perf_counter()
+    registry["export_worker"](filepath, changes_only)
+    seconds = time.perf_counter() - start
+    messages = registry["task_messages"]
+    while not messages.empty():
+        last_message = messages.get()
+    if last_message[0] not in ("exported", "exportat"):
+        raise RuntimeError(f"export failed: {last_message}")
+    return seconds
+
+
+def bench_size(script, rows, runs, rnd):
+    result = {"rows": rows}
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        try:
+            registry = load_registry(script, folder)
+            conn = registry["conn"]
+
+            start = time.perf_counter()
+            generate(registry, rows, rnd)
+            result["generate_s"] = round(time.perf_counter() - start, 2)
+
+            # save_record(): one INSERT in its own write transaction
+            result["save"] = timed(lambda: registry["write_transaction"](
+                conn, registry["insert_record"], random_record(rnd, rnd.randrange(rows))), runs)
+
+            # search_records(): first page for each kind of query
+            sample = conn.execute(registry["queries"]["sample"], (rnd.randrange(1, rows),)).fetchone()
+            searches = {
+                "idnp": (sample[0],),
+                "act_number": (sample[1],),
+                "act_number_prefix": (sample[1][:3],),
+                "name": (sample[2],),
+                "name_prefix": (sample[2].split()[-1][:4],),
+                "month_and_act_type": ("", "2020-03-01", "2020-03-31", "Power of Attorney"),
+                "name_in_year": (sample[2], "2020-01-01", "2020-12-31"),
+            }
+            result["search"] = {}
+            for name, arguments in searches.items():
+                condition, params = registry["search_condition"](*arguments)
+                result["search"][name] = timed(lambda: first_page(registry, condition, params), runs)
+
+            # display_records(): the first page, then paging to the end of the table
+            result["display_first_page"] = timed(lambda: first_page(registry, "", {}), runs)
+            last_id = conn.execute(registry["queries"]["last_id"]).fetchone()[0]
+            page = {"last_id": last_id - 20 * registry["PAGE_SIZE"], "limit": registry["PAGE_SIZE"]}
+            result["display_page_near_end"] = timed(
+                lambda: conn.execute(registry["page_query"](""), page).fetchall(), runs)
+
+            # delete_record(): one DELETE in its own write transaction
+            # At most half of a small registry is deleted at once
+            bulk = min(BULK_DELETE, rows // 2)
+            ids = rnd.sample(range(1, rows + 1), runs + bulk)
+            deleted = set(ids)
+            result["delete"] = timed(lambda: registry["write_transaction"](
+                conn, registry["delete_rows"], [ids.pop()]), runs)
+
+            # delete_record() on a selection of many records, one transaction
+            start = time.perf_counter()
+            registry["write_transaction"](conn, registry["delete_rows"], ids)
+            result["bulk_delete"] = {"rows": bulk, "ms": round((time.perf_counter() - start) * 1000, 3)}
+
+            # export_to_excel(): the whole export worker, as run in the background
+            result["export"] = {}
+            for export_format in EXPORT_FORMATS:
+                seconds = export(registry, os.path.join(folder, f"export.{export_format}"))
+                result["export"][export_format] = {"s": round(seconds, 2), "rows_per_s": round(rows / seconds)}
+
+            # export_changes(): the first one writes every record, the next only what changed since
+            # Only records the deletes above left in place are deleted again
+            export(registry, os.path.join(folder, "changes.csv"), True)
+            kept = [record_id for record_id in range(1, rows + 1) if record_id not in deleted]
+            changed = rnd.sample(kept, min(runs, len(kept)))
+            for record_id in changed:
+                registry["write_transaction"](conn, registry["insert_record"], random_record(rnd, record_id))
+                registry["write_transaction"](conn, registry["delete_rows"], [record_id])
+            seconds = export(registry, os.path.join(folder, "changes.csv"), True)
+            result["export_changes"] = {"changes": 2 * len(changed), "ms": round(seconds * 1000, 3)}
+
+            close_registry(registry)
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registry benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma-separated registry sizes")
+    parser.add_argument("--runs", type=int, default=50, help="timed runs per operation")
+    parser.add_argument("--script", default=str(SCRIPT), help="registry script to measure")
+    parser.add_argument("--output", default="benchmark.json", help="JSON report")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    script = pathlib.Path(args.script).resolve()
+    report = {
+        "script": script.name,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": [],
+    }
+    rnd = random.Random(1)
+    for rows in (int(size) for size in args.sizes.split(",")):
+        result = bench_size(script, rows, args.runs, rnd)
+        report["results"].append(result)
+        print(f"{rows} rows: generated in {result['generate_s']}s, "
+              f"save {result['save']['p50_ms']} ms, "
+              f"search by IDNP {result['search']['idnp']['p50_ms']} ms, "
+              f"first page {result['display_first_page']['p50_ms']} ms, "
+              f"delete {result['delete']['p50_ms']} ms, "
+              f"delete of {result['bulk_delete']['rows']} {result['bulk_delete']['ms']} ms, "
+              "export " + ", ".join(f"{export_format} {timing['rows_per_s']} rows/s"
+                                    for export_format, timing in result["export"].items())
+              + f", changes only {result['export_changes']['ms']} ms")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
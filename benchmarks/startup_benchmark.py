@@ -0,0 +1,54 @@
+import argparse
+import os
+import pathlib
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from registry_benchmark import SCRIPT, load_registry, close_registry, generate
+
+# Starts the registry script on a generated registry.db and measures how long it
+# takes until the window is drawn and until the first page of rows is shown.
+# Needs a display, the real window is opened (and closed again) on every run.
+
+
+def start_once(script, folder):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(script), "--startup-time"], cwd=folder,
+                               stdout=subprocess.PIPE, text=True)
+    times = {}
+    for line in process.stdout:
+        times[line.strip()] = time.perf_counter() - start
+    process.wait()
+    if process.returncode or len(times) != 2:
+        raise RuntimeError(f"the script exited with {process.returncode}, printed {list(times)}")
+    return times["window"], times["first page"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--script", default=str(SCRIPT), help="registry script to measure")
+    args = parser.parse_args()
+
+    script = pathlib.Path(args.script).resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        # load_registry() creates and migrates the database, so every run below is a normal start
+        registry = load_registry(script, folder)
+        generate(registry, args.rows, random.Random(1))
+        close_registry(registry)
+        os.chdir(cwd)
+
+        runs = [start_once(script, folder) for _ in range(args.runs)]
+    print(f"{args.rows} rows, {args.runs} runs, median seconds")
+    print(f"window drawn  {statistics.median(run[0] for run in runs):8.3f}")
+    print(f"first page    {statistics.median(run[1] for run in runs):8.3f}")
+
+
+if __name__ == "__main__":
+    main()